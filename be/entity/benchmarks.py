@@ -0,0 +1,708 @@
+"""
+Benchmark suites for the entity hierarchy.
+
+Run a suite with `python manage.py benchmark <suite> [--sizes N ...]`. Each size runs inside its own
+transaction that is rolled back afterwards, so seeded rows never persist in the target database. Suites that
+read from several connections at once commit their rows instead and delete them when they finish.
+"""
+import gc
+import json
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, ROUND_DOWN
+from pathlib import Path
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import override_settings
+from rest_framework.pagination import Cursor, PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from entity.hierarchy import BACKENDS, get_backend
+from entity.models import Attribute, Entity
+from entity.pagination import EntityCursorPagination
+from entity.renderers import CSVRenderer, NDJSONRenderer, SubtreeJSONRenderer, orjson
+from entity.serializers import GenericEASerializer
+from entity.streaming import subtree_records
+from entity.views import EntityViewSet, SimpleUseViewSet, SubtreeExportView
+
+
+SUITES = {}
+FIXTURE = Path(__file__).parent / 'tests' / 'test_data.sql'
+
+
+def suite(name, sizes):
+    """Registers a benchmark suite under `name` with its default table sizes."""
+    def decorator(func):
+        SUITES[name] = (func, sizes)
+        return func
+    return decorator
+
+
+def timed(func, *args, **kwargs):
+    """Calls `func` and returns a tuple of its result and the elapsed wall time in seconds."""
+    start_time = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start_time
+
+
+def traced(func, *args, **kwargs):
+    """Calls `func` and returns a tuple of its result and the peak memory it allocated in MiB."""
+    tracemalloc.start()
+    try:
+        result = func(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, peak / 2 ** 20
+
+
+def synthetic_rows(size, fanout=10, attributes=2, root_name='Bench'):
+    """
+    Generates `size` rows shaped like `EntityManager.fetch_descendants` output without touching the database.
+
+    Every entity contributes `attributes` rows, so the tree holds `size // attributes` entities.
+    """
+    value = Decimal('12.156')
+    paths = []
+    rows = []
+    for i in range(max(size // attributes, 1)):
+        if i == 0:
+            name, parent_id, path = root_name, None, f'/{root_name}'
+        else:
+            name, parent_id = f'Node{i}', (i - 1) // fanout
+            path = f'{paths[parent_id]}/{name}'
+        paths.append(path)
+        for k in range(attributes):
+            rows.append((i, name, path, parent_id, f'Key{k}', value, None))
+    return rows
+
+
+def seed_tree(size, fanout=10, attributes=0, root_name='Bench'):
+    """
+    Inserts a synthetic tree of `size` nodes in breadth-first order using a single statement.
+
+    Node `i` is named `Node<i>` and is the child of node `(i - 1) // fanout`, so with the default fanout
+    the subtree under `/<root_name>/Node1/Node11` holds roughly a thousandth of the tree.
+
+    Args:
+        size (int): The number of entities to create, including the root.
+        fanout (int): The number of children per node.
+        attributes (int): The number of attributes to create on every node.
+        root_name (str): The name of the root entity.
+
+    Returns:
+        str: The path of the root entity.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM entity_entity")
+        base_id = cursor.fetchone()[0]
+        cursor.execute(
+            """
+            INSERT INTO entity_entity (id, name, parent_id, parent_path, depth, path, tree_id, created_at, updated_at)
+            WITH RECURSIVE tree (i, name, parent_path, depth, path) AS (
+                SELECT 0, %(root)s::text, NULL::text, 0, '/' || %(root)s
+                UNION ALL
+                SELECT child.i, 'Node' || child.i, tree.path, tree.depth + 1, tree.path || '/Node' || child.i
+                FROM tree
+                CROSS JOIN LATERAL generate_series(
+                    tree.i * %(fanout)s + 1, LEAST(tree.i * %(fanout)s + %(fanout)s, %(size)s - 1)
+                ) AS child (i)
+            )
+            SELECT %(base)s + i,
+                name,
+                CASE WHEN i = 0 THEN NULL ELSE %(base)s + (i - 1) / %(fanout)s END,
+                parent_path,
+                depth,
+                path,
+                %(base)s,
+                NOW(),
+                NOW()
+            FROM tree
+            """,
+            {'root': root_name, 'fanout': fanout, 'size': size, 'base': base_id},
+        )
+        if attributes:
+            cursor.execute(
+                """
+                INSERT INTO entity_attribute (entity_id, key, value, scale, created_at, updated_at)
+                SELECT e.id, 'Key' || k, v.value, 3, NOW(), NOW()
+                FROM entity_entity e
+                CROSS JOIN generate_series(1, %s) AS k
+                CROSS JOIN LATERAL (SELECT ((e.id * k) %% 100000 / 1000.0)::numeric(20, 3) AS value) v
+                WHERE e.tree_id = %s
+                """,
+                [attributes, base_id],
+            )
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence('entity_entity', 'id'), %s)",
+            [base_id + size - 1],
+        )
+        cursor.execute("ANALYZE entity_entity")
+    return f'/{root_name}'
+
+
+def committed(func, *args, **kwargs):
+    """Calls `func` on a connection of its own, outside the suite's transaction, so that its writes commit."""
+    def run():
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(run).result()
+
+
+def delete_tree(root_path):
+    """Deletes the tree rooted at `root_path` and its attributes."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT tree_id FROM entity_entity WHERE path = %s", [root_path])
+        tree_id = cursor.fetchone()[0]
+        cursor.execute(
+            "DELETE FROM entity_attribute a USING entity_entity e WHERE a.entity_id = e.id AND e.tree_id = %s",
+            [tree_id],
+        )
+        cursor.execute("DELETE FROM entity_entity WHERE tree_id = %s", [tree_id])
+
+
+def load_fixture():
+    """Loads the 40,000 node stress test fixture and returns the path of its root entity."""
+    with connection.cursor() as cursor:
+        cursor.execute(FIXTURE.read_text())
+    Entity.objects.backfill_hierarchy()
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE entity_entity")
+    return '/Node.1.0'
+
+
+def _legacy_update_child_paths(old_path, new_path):
+    """The unscoped path rewrite that preceded EntityManager.update_child_paths_raw."""
+    with connection.cursor() as cursor:
+        cursor.execute("UPDATE entity_entity SET path = REPLACE(path, %s, %s)", [old_path, new_path])
+        return cursor.rowcount
+
+
+def _count_renamed(new_path):
+    """Counts the rows renamed into `new_path`'s subtree and the rows whose names merely gained its prefix."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT COUNT(*) FILTER (WHERE path = %s OR path LIKE %s), COUNT(*) FILTER (WHERE path LIKE %s)
+            FROM entity_entity
+            """,
+            [new_path, f'{new_path}/%', f'{new_path}%'],
+        )
+        renamed, prefixed = cursor.fetchone()
+    return renamed, prefixed - renamed
+
+
+@suite('rename', sizes=[10_000, 100_000, 1_000_000])
+def rename(size):
+    """
+    Renames a subtree holding ~0.1% of the table with the legacy and the scoped rewrite.
+
+    Each implementation renames the same subtree from a savepoint that is rolled back afterwards. A sibling whose
+    name starts with the renamed node's name shows any rows renamed outside the subtree as `overmatched`.
+    """
+    root_path = seed_tree(size)
+    old_path = f'{root_path}/Node1/Node11'
+    new_path = f'{root_path}/Node1/Renamed11'
+    Entity.objects.create(name='Node11 Spare', parent=Entity.objects.get(path=f'{root_path}/Node1'))
+
+    implementations = [('legacy', _legacy_update_child_paths), ('scoped', Entity.objects.update_child_paths_raw)]
+    for implementation, func in implementations:
+        savepoint = transaction.savepoint()
+        rows, seconds = timed(func, old_path, new_path)
+        renamed, overmatched = _count_renamed(new_path)
+        transaction.savepoint_rollback(savepoint)
+        yield {'size': size, 'implementation': implementation, 'rows': rows, 'renamed': renamed,
+               'overmatched': overmatched, 'seconds': seconds}
+
+
+def _legacy_update_child_trees(path, tree_id):
+    """The row-by-row select_for_update() and bulk_update() that preceded the set-based update_child_trees."""
+    descendant_entities = Entity.objects.select_for_update().filter(path__startswith=path).exclude(path=path)
+    for descendant in descendant_entities:
+        descendant.tree_id = tree_id
+    Entity.objects.bulk_update(descendant_entities, ['tree_id'])
+    return len(descendant_entities)
+
+
+@suite('tree-move', sizes=[10_000, 100_000])
+def tree_move(size):
+    """Moves `size` descendants into another tree with the legacy and the set-based tree_id propagation."""
+    root_path = seed_tree(size + 1)
+    tree_id = Entity.objects.get(path=root_path).tree_id
+
+    rows, seconds = timed(_legacy_update_child_trees, root_path, tree_id + 1)
+    yield {'size': size, 'implementation': 'legacy', 'rows': rows, 'seconds': seconds}
+
+    rows, seconds = timed(Entity.objects.update_child_trees, root_path, tree_id)
+    yield {'size': size, 'implementation': 'set-based', 'rows': rows, 'seconds': seconds}
+
+
+def _legacy_create_or_update_attribute(self, dynamic_dict, context):
+    """The per-key exists()/create()/save() loop that preceded AttributeManager.bulk_upsert."""
+    entity = Entity.objects.get(path=context.get('path'))
+    with transaction.atomic():
+        for key, value in dynamic_dict.items():
+            attribute_queryset = Attribute.objects.filter(entity=entity, key=key)
+            if not attribute_queryset.exists():
+                Attribute.objects.create(entity=entity, key=key, value=value)
+            else:
+                attribute = attribute_queryset.first()
+                attribute.key = key
+                attribute.value = value
+                attribute.save()
+    entity.refresh_from_db()
+    return entity.subtree()
+
+
+@suite('attribute-post', sizes=[1, 10, 100, 1000])
+def attribute_post(size):
+    """Times POSTs creating and then updating `size` properties with the legacy loop and the bulk upsert."""
+    view = SimpleUseViewSet.as_view({'post': 'create'})
+    factory = APIRequestFactory()
+    implementations = {
+        'legacy': _legacy_create_or_update_attribute,
+        'bulk-upsert': GenericEASerializer._handle_create_or_update_attribute,
+    }
+    for name, func in implementations.items():
+        root_name = f'Bench{name.title()}'
+        Entity.objects.create(name=root_name)
+        for operation, value in [('create', '1.5'), ('update', '2.25')]:
+            payload = json.dumps({f'Key{i}': value for i in range(size)})
+            request = factory.post(f'/{root_name}', payload, content_type='application/json')
+            with patch.object(GenericEASerializer, '_handle_create_or_update_attribute', func):
+                response, seconds = timed(view, request, path=root_name)
+            assert response.status_code == 201, response.data
+            yield {'properties': size, 'implementation': name, 'operation': operation, 'seconds': seconds}
+
+
+def synthetic_records(size, fanout=10, attributes=3, root_name='Bench'):
+    """Generates `size` bulk import records shaped like a bill of materials, listed children first."""
+    paths = []
+    records = []
+    for i in range(size):
+        path = f'/{root_name}' if i == 0 else f'{paths[(i - 1) // fanout]}/Node{i}'
+        paths.append(path)
+        records.append((path, {f'Key{k}': Decimal(f'{i % 1000}.125') for k in range(attributes)}))
+    return list(reversed(records))
+
+
+def _create_one_by_one(records):
+    """Creates records through Entity.save() and Attribute.save(), as one POST per node would."""
+    entities = {}
+    for path, properties in reversed(records):
+        parent_path, name = path.rsplit('/', 1)
+        entity = entities[path] = Entity.objects.create(name=name, parent=entities.get(parent_path))
+        for key, value in properties.items():
+            Attribute.objects.create(entity=entity, key=key, value=value)
+
+
+@suite('import', sizes=[5_000, 50_000])
+def bulk_import(size):
+    """
+    Measures entity and attribute rows written per second by EntityManager.bulk_import and by saving each
+    node individually. Individual saves are sampled on the first 1,000 nodes to keep run times reasonable.
+    """
+    records = synthetic_records(size)
+    rows = size + sum(len(properties) for _, properties in records)
+    _, seconds = timed(Entity.objects.bulk_import, records)
+    yield {'size': size, 'implementation': 'bulk-import', 'seconds': seconds, 'rows_per_second': rows / seconds}
+
+    sample = synthetic_records(min(size, 1_000), root_name='BenchSample')
+    rows = len(sample) + sum(len(properties) for _, properties in sample)
+    _, seconds = timed(_create_one_by_one, sample)
+    yield {'size': len(sample), 'implementation': 'one-by-one', 'seconds': seconds, 'rows_per_second': rows / seconds}
+
+
+def _legacy_build_tree(rows, root_path):
+    """The path-keyed tree assembly that preceded EntityManager.assemble_tree."""
+    entities = {}
+    attributes = defaultdict(lambda: defaultdict(Decimal))
+
+    for row in rows:
+        entity_id, name, path, parent_id, attr_key, attr_value = row[:6]
+        if entity_id not in entities:
+            entities[path] = {
+                "id": entity_id,
+                "name": name,
+                "path": path,
+                "properties": {},
+                "descendants": []
+            }
+        if attr_key:
+            attributes[path][attr_key] = attr_value
+
+    for entity_path, props in attributes.items():
+        if entity_path in entities:
+            entities[entity_path]["properties"] = props
+
+    tree = {}
+    for entity in entities.values():
+        if entity["path"] == root_path:
+            tree = entity
+        else:
+            parent_path = "/".join(entity["path"].split("/")[:-1])
+            parent = entities.get(parent_path)
+            if parent:
+                parent["descendants"].append(entity)
+
+    return tree
+
+
+@suite('build-tree', sizes=[40_000, 400_000, 2_000_000])
+def build_tree(size):
+    """Assembles `size` synthetic joined rows with the legacy and the single-pass tree builders."""
+    rows = synthetic_rows(size)
+    implementations = {
+        'legacy': _legacy_build_tree,
+        'single-pass': Entity.objects.assemble_tree,
+    }
+    for name, func in implementations.items():
+        # Time and trace separately since tracemalloc slows allocation-heavy code
+        _, seconds = timed(func, rows, '/Bench')
+        _, peak_mib = traced(func, rows, '/Bench')
+        yield {'rows': size, 'implementation': name, 'seconds': seconds, 'peak_mib': peak_mib}
+
+
+def _legacy_fetch_descendants(root_path):
+    """The client-side fetchall() that preceded the batched EntityManager.fetch_descendants generator."""
+    with connection.cursor() as cursor:
+        cursor.execute(*Entity.objects.descendants_query(root_path))
+        return cursor.fetchall()
+
+
+def _consume(rows):
+    count = 0
+    for _ in rows:
+        count += 1
+    return count
+
+
+@suite('fetch', sizes=[40_000])
+def fetch(size):
+    """
+    Compares peak Python memory of reading a subtree with fetchall() and with server-side cursor batches.
+
+    Uses the stress test fixture when it is present, otherwise a synthetic tree of `size` nodes with three
+    attributes each. Memory allocated by libpq outside the Python allocator is not traced.
+    """
+    if FIXTURE.exists():
+        source, root_path = 'fixture', load_fixture()
+    else:
+        source, root_path = 'synthetic', seed_tree(size, attributes=3)
+
+    implementations = {
+        'fetchall': lambda: _consume(_legacy_fetch_descendants(root_path)),
+        'server-side': lambda: _consume(Entity.objects.fetch_descendants(root_path)),
+        'fetchall+build': lambda: Entity.objects.assemble_tree(_legacy_fetch_descendants(root_path), root_path),
+        'server-side+build': lambda: Entity.objects.build_tree(root_path),
+    }
+    for name, func in implementations.items():
+        _, seconds = timed(func)
+        _, peak_mib = traced(func)
+        yield {'source': source, 'implementation': name, 'seconds': seconds, 'peak_mib': peak_mib}
+
+
+@suite('export', sizes=[10_000, 100_000, 400_000])
+def export(size):
+    """Measures time and peak Python memory of streaming a `size` node subtree as NDJSON and as CSV."""
+    root_path = seed_tree(size, attributes=2)
+    for renderer in [NDJSONRenderer(), CSVRenderer()]:
+        def run():
+            rows = Entity.objects.fetch_descendants(root_path)
+            records = subtree_records(rows, root_path)
+            return sum(len(chunk) for chunk in renderer.stream(records, SubtreeExportView.export_fields))
+
+        size_bytes, seconds = timed(run)
+        _, peak_mib = traced(run)
+        yield {'size': size, 'format': renderer.format, 'mib': size_bytes / 2 ** 20, 'seconds': seconds,
+               'peak_mib': peak_mib}
+
+
+@suite('write-ack', sizes=[1_000, 10_000, 100_000])
+def write_ack(size):
+    """Times POSTs adding a property to the root of a `size` node tree with full and minimal responses."""
+    root_path = seed_tree(size)
+    view = SimpleUseViewSet.as_view({'post': 'create'})
+    factory = APIRequestFactory()
+    for response_mode, query in [('subtree', ''), ('minimal', '?return=minimal')]:
+        request = factory.post(f'{root_path}{query}', {'Thrust': '9.493'}, format='json')
+        # Include rendering, which is most of the cost of a large subtree response
+        response, seconds = timed(lambda: view(request, path=root_path.strip('/')).render())
+        assert response.status_code == 201, response.data
+        yield {'size': size, 'response': response_mode, 'seconds': seconds}
+
+
+def _latencies(finish_times, start_time):
+    return sorted(finish_time - start_time for finish_time in finish_times)
+
+
+def _serve(requests, threads):
+    """Serves `requests` with the viewset on `threads` threads, like one threaded worker."""
+    view = SimpleUseViewSet.as_view({'get': 'get'})
+
+    def serve(request, path):
+        view(request, path=path).render()
+        return time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        start_time = time.perf_counter()
+        finish_times = list(executor.map(lambda args: serve(*args), requests))
+    return start_time, finish_times
+
+
+@suite('concurrent-reads', sizes=[40_000])
+def concurrent_reads(size):
+    """
+    Serves 100 parallel subtree GETs, every tenth for the whole `size` node tree and the rest for subtrees of
+    about 50 nodes, with the viewset on pools of 4, 16 and 64 threads.
+
+    Latencies are measured from when all requests were issued, so they include time spent waiting for a thread.
+    Under Uvicorn, Django also runs each request's view on a thread of its own, so the larger pools show what
+    an ASGI worker can do with enough database connections.
+    Subtree caching is off so that every request reads the database.
+    """
+    root_path = committed(seed_tree, size, attributes=2)
+    small_path = f'{root_path}/Node1/Node11'
+    factory = APIRequestFactory()
+    requests = []
+    for i in range(100):
+        path = root_path if i % 10 == 0 else small_path
+        requests.append((factory.get(path), path.strip('/')))
+    small = [i for i in range(len(requests)) if i % 10]
+
+    try:
+        with override_settings(SUBTREE_CACHE_TIMEOUT=0):
+            for threads in [4, 16, 64]:
+                start_time, finish_times = _serve(requests, threads)
+                latencies = _latencies(finish_times, start_time)
+                small_latencies = _latencies([finish_times[i] for i in small], start_time)
+                yield {
+                    'threads': threads,
+                    'seconds': latencies[-1],
+                    'p50_ms': latencies[len(latencies) // 2] * 1000,
+                    'p99_ms': latencies[98] * 1000,
+                    'small_p50_ms': small_latencies[len(small_latencies) // 2] * 1000,
+                }
+    finally:
+        committed(delete_tree, root_path)
+
+
+def _extension_available(name):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = %s", [name])
+        return cursor.fetchone() is not None
+
+
+@suite('hierarchy', sizes=[10_000, 100_000, 1_000_000])
+def hierarchy(size):
+    """
+    Compares the hierarchy backends on one `size` node tree: building the backend's structure from scratch,
+    reading subtrees of ~0.1% and ~10% of the tree, creating 100 entities one by one and moving a ~0.1%
+    subtree to another parent. The ltree backend is skipped when the extension is not available.
+    """
+    names = [name for name in BACKENDS if name != 'ltree' or _extension_available('ltree')]
+    # Install before seeding, as the ltree column cannot be added while the seeded rows' checks are pending
+    for name in names:
+        get_backend(name).install()
+    root_path = seed_tree(size)
+    small_path, large_path = f'{root_path}/Node1/Node11', f'{root_path}/Node1'
+    for name in names:
+        with override_settings(ENTITY_HIERARCHY_BACKEND=name):
+            backend = get_backend()
+            _, build_seconds = timed(backend.rebuild)
+
+            reads = {}
+            for label, path in [('small', small_path), ('large', large_path)]:
+                # Warm up the cache and the plan before timing
+                _consume(Entity.objects.fetch_descendants(path))
+                reads[label], reads[f'{label}_seconds'] = timed(_consume, Entity.objects.fetch_descendants(path))
+
+            parent = Entity.objects.get(path=f'{root_path}/Node2')
+            _, insert_seconds = timed(lambda: [
+                Entity.objects.create(name=f'{name.title()}{i}', parent=parent) for i in range(100)
+            ])
+
+            moved = Entity.objects.get(path=small_path)
+            moved.parent = Entity.objects.get(path=f'{root_path}/Node3')
+            _, move_seconds = timed(moved.save)
+            # Move it back so that every backend works on the same tree
+            moved.parent = Entity.objects.get(path=large_path)
+            moved.save()
+
+        yield {
+            'size': size,
+            'backend': name,
+            'build_seconds': build_seconds,
+            'read_small_ms': reads['small_seconds'] * 1000,
+            'read_large_ms': reads['large_seconds'] * 1000,
+            'insert_ms': insert_seconds * 10,
+            'move_ms': move_seconds * 1000,
+            'small_rows': reads['small'],
+        }
+
+
+@suite('search', sizes=[100_000, 1_000_000])
+def search(size):
+    """
+    Times search queries against the search box's previous approach, which GETs the partial path and, when that
+    is missing, falls back to building the subtree of its parent.
+    """
+    root_path = seed_tree(size)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE entity_entity")
+    queries = [f'{root_path[1:]}/Node1/Nod', 'Node12', 'Node9999', 'N', '/Be']
+    for query in queries:
+        # Warm up the plan before timing
+        Entity.objects.search(query)
+        results, seconds = timed(Entity.objects.search, query)
+        yield {'size': size, 'implementation': 'search', 'query': query, 'matches': len(results), 'ms': seconds * 1000}
+
+    parent_path = '/' + queries[0].rsplit('/', 1)[0]
+    tree, seconds = timed(Entity.objects.build_tree, parent_path)
+    yield {'size': size, 'implementation': 'parent-subtree', 'query': queries[0], 'matches': len(tree['descendants']),
+           'ms': seconds * 1000}
+
+
+@suite('pagination', sizes=[200_000, 1_000_000])
+def pagination(size, page_size=10, deep_page=10_000):
+    """
+    Times the entity list's first page and page `deep_page` with the previous page number pagination and with
+    cursor pagination, which is also timed without the total count.
+    """
+    seed_tree(size)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE entity_entity")
+    factory = APIRequestFactory()
+    user = User(username='benchmark')
+    list_url = '/api/v1/entity/'
+
+    # Seek past the last entity of the page before the deep page, as the cursor in the previous page's next link does
+    paginator = EntityCursorPagination()
+    paginator.base_url = f'http://testserver{list_url}'
+    position = Entity.objects.order_by('path', 'id').values_list('path', flat=True)[(deep_page - 1) * page_size - 1]
+    deep_cursor_url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    page_number_view = type('PageNumberEntityViewSet', (EntityViewSet,), {'pagination_class': PageNumberPagination})
+    cases = [
+        ('page-number', page_number_view, 1, f'{list_url}?page=1'),
+        ('page-number', page_number_view, deep_page, f'{list_url}?page={deep_page}'),
+        ('cursor', EntityViewSet, 1, list_url),
+        ('cursor', EntityViewSet, deep_page, deep_cursor_url),
+        ('cursor-no-count', EntityViewSet, 1, f'{list_url}?count=false'),
+        ('cursor-no-count', EntityViewSet, deep_page, f'{deep_cursor_url}&count=false'),
+    ]
+    for implementation, viewset, page, url in cases:
+        view = viewset.as_view({'get': 'list'})
+        request = factory.get(url)
+        force_authenticate(request, user)
+        # Allow the request factory's host, which the next and previous links are built from
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            response, seconds = timed(lambda: view(request).render())
+        assert response.status_code == 200 and len(response.data['results']) == page_size, response.data
+        yield {'size': size, 'implementation': implementation, 'page': page, 'ms': seconds * 1000}
+
+
+class _LegacyJSONRenderer(JSONRenderer):
+    """The renderer that preceded SubtreeJSONRenderer, rewriting property values in place before encoding."""
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            precise = None
+            request = renderer_context.get('request', None)
+            if request:
+                precise = request.GET.get('precise', None)
+            self._convert_decimals(data, precise)
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def _convert_decimals(self, data, precise=None):
+        data_keys = data.keys()
+        if 'properties' in data_keys and len(data.get('properties').keys()) > 0:
+            for key, value in data.get('properties').items():
+                if precise == 'true':
+                    data['properties'][key] = str(value)
+                else:
+                    data['properties'][key] = value
+        if 'descendants' in data_keys:
+            for d in data.get('descendants'):
+                self._convert_decimals(d, precise)
+
+
+def _legacy_quantized_rows(root_path):
+    """
+    Reads subtree rows the way they were read before attributes stored a scale: the stored value alongside the
+    text it was written with, which is turned into a Decimal quantizer for every value.
+    """
+    query, params = Entity.objects.descendants_query(root_path)
+    legacy_column = "a.value AS attribute_value, TRUNC(a.value, a.scale)::text AS attribute_quantizer"
+    assert "TRUNC(a.value, a.scale) AS attribute_value" in query
+    query = query.replace("TRUNC(a.value, a.scale) AS attribute_value", legacy_column)
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        for entity_id, name, path, parent_id, attr_key, attr_value, attr_quantizer, child_count in cursor.fetchall():
+            value = attr_value.quantize(
+                Decimal(attr_quantizer), rounding=ROUND_DOWN
+            ) if attr_value and attr_quantizer else None
+            yield entity_id, name, path, parent_id, attr_key, value, child_count
+
+
+@suite('decimals', sizes=[100_000, 400_000])
+def decimals(size, attributes=4):
+    """
+    Times reading, assembling and rendering a subtree holding `size` properties with values truncated in Python
+    from their written text and with values truncated to their scale by the database.
+    """
+    root_path = seed_tree(size // attributes, attributes=attributes)
+    factory = APIRequestFactory()
+    implementations = [
+        ('quantize-in-python', lambda: Entity.objects.assemble_tree(_legacy_quantized_rows(root_path), root_path)),
+        ('scale-in-sql', lambda: Entity.objects.build_tree(root_path)),
+    ]
+    for precise in ['false', 'true']:
+        context = {'request': factory.get('/', {'precise': precise})}
+        for name, build in implementations:
+            # Time assembling and rendering together, as a subtree GET does
+            body, seconds = timed(lambda: _LegacyJSONRenderer().render(build(), 'application/json', context))
+            yield {'properties': size, 'precise': precise, 'implementation': name, 'mib': len(body) / 2 ** 20,
+                   'ms_per_100k_properties': seconds * 1000 * 100_000 / size}
+
+
+@suite('render', sizes=[40_000])
+def render(size):
+    """
+    Times rendering a subtree with the previous renderer and with SubtreeJSONRenderer on each encoder.
+
+    Uses the stress test fixture when it is present, otherwise a synthetic tree of `size` nodes with three
+    attributes each. Each renderer is timed on a fresh tree, as the previous renderer rewrites it in place, and
+    the best of three runs is reported.
+    """
+    if FIXTURE.exists():
+        source, root_path = 'fixture', load_fixture()
+    else:
+        source, root_path = 'synthetic', seed_tree(size, attributes=3)
+
+    factory = APIRequestFactory()
+    implementations = [('legacy', _LegacyJSONRenderer, 'json'), ('subtree-json', SubtreeJSONRenderer, 'json')]
+    if orjson is not None:
+        implementations.append(('subtree-orjson', SubtreeJSONRenderer, 'orjson'))
+    for precise in ['false', 'true']:
+        context = {'request': factory.get('/', {'precise': precise})}
+        bodies = {}
+        for name, renderer_class, encoder in implementations:
+            best = None
+            for _ in range(3):
+                tree = Entity.objects.build_tree(root_path)
+                gc.collect()
+                with override_settings(ENTITY_JSON_ENCODER=encoder):
+                    body, seconds = timed(renderer_class().render, tree, 'application/json', context)
+                best = seconds if best is None else min(best, seconds)
+            bodies[name] = json.loads(body)
+            yield {'source': source, 'precise': precise, 'implementation': name, 'mib': len(body) / 2 ** 20,
+                   'ms': best * 1000}
+        assert all(body == bodies['legacy'] for body in bodies.values()), 'Renderers disagree'
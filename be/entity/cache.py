@@ -0,0 +1,107 @@
+"""
+Subtree cache keyed by path and a per-path version.
+
+Writes replace the version of the written entity's path and of each of its ancestors, which orphans exactly the
+cached subtrees that contained the change. Moves also replace a global epoch because they change the path of
+every descendant. Versions are random rather than counters so that an evicted version can never be reissued
+and revive a stale entry.
+"""
+import hashlib
+from uuid import uuid4
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+EPOCH_KEY = 'subtree:epoch'
+HITS_KEY = 'subtree:hits'
+MISSES_KEY = 'subtree:misses'
+
+
+def ancestor_paths(path):
+    """Returns `path` followed by the path of each of its ancestors."""
+    parts = path.strip('/').split('/')
+    return ['/' + '/'.join(parts[:i]) for i in range(len(parts), 0, -1)]
+
+
+def get_or_build(path, build, **options):
+    """
+    Returns the cached subtree for `path` and `options`, calling `build` to produce and store it on a miss.
+
+    Args:
+        path (str): The path of the subtree's root entity.
+        build (callable): Builds the subtree when it is not cached.
+        **options: Query options that change the subtree's contents, such as depth limits.
+    """
+    versions = _get_versions([EPOCH_KEY, _version_key(path)])
+    key = ':'.join([
+        'subtree',
+        versions[EPOCH_KEY],
+        versions[_version_key(path)],
+        *(f'{name}={value}' for name, value in sorted(options.items())),
+        _digest(path),
+    ])
+    tree = cache.get(key)
+    if tree is not None:
+        _count(HITS_KEY)
+        return tree
+
+    _count(MISSES_KEY)
+    tree = build()
+    cache.set(key, tree, settings.SUBTREE_CACHE_TIMEOUT)
+    return tree
+
+
+def invalidate(path):
+    """Orphans the cached subtrees of `path` and its ancestors now and again once the transaction commits."""
+    _replace_versions([_version_key(p) for p in ancestor_paths(path)])
+
+
+def invalidate_moved(old_path, new_path):
+    """Orphans every cached subtree after an entity moves from `old_path` to `new_path`."""
+    _replace_versions([_version_key(p) for p in {*ancestor_paths(old_path), *ancestor_paths(new_path)}] + [EPOCH_KEY])
+
+
+def stats():
+    hits, misses = (cache.get(key, 0) for key in (HITS_KEY, MISSES_KEY))
+    return {
+        'backend': cache.__class__.__name__,
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else None,
+    }
+
+
+def _replace_versions(keys):
+    def replace():
+        cache.set_many({key: uuid4().hex for key in keys}, None)
+
+    replace()
+    # Replace again after commit in case a concurrent read cached uncommitted state under the new version
+    transaction.on_commit(replace)
+
+
+def _get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid4().hex, None)
+            # Fall back to a throwaway version when the backend does not retain values
+            versions[key] = cache.get(key) or uuid4().hex
+    return versions
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def _version_key(path):
+    return f'subtree:version:{_digest(path)}'
+
+
+def _digest(path):
+    # Paths may be long or contain characters that some cache backends reject in keys
+    return hashlib.sha1(path.encode('utf-8')).hexdigest()
@@ -0,0 +1,215 @@
+"""
+Hierarchy backends that find an entity's descendants and keep their index structure current as entities change.
+
+Every backend keeps the materialized `path` as the address of an entity, so lookups by path, renames and the API
+work the same with any of them. They differ in the structure used to select a subtree:
+
+* `path` matches the path prefix with LIKE, served by the varchar_pattern_ops index on path.
+* `ltree` matches an ltree of ancestor ids with `<@`, served by a GiST index. It needs the ltree extension.
+* `closure` joins a closure table holding a row for every ancestor and descendant pair, including each entity
+  paired with itself.
+
+The backend is chosen with the ENTITY_HIERARCHY_BACKEND setting. Only the selected backend's structure is
+maintained on writes, so run `python manage.py rebuild_hierarchy` after switching to fill in the new one.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+
+
+def escape_like(value):
+    """Escapes LIKE wildcards so that a path can be used as a literal pattern prefix."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class PathHierarchy:
+    """Selects subtrees by path prefix. Paths are maintained by `Entity.save`, so the write hooks do nothing."""
+    name = 'path'
+
+    def install(self):
+        """Creates any database objects the backend needs beyond those created by migrations."""
+
+    def subtree_filter(self, alias, root_path):
+        """
+        Builds a condition matching an entity and all of its descendants.
+
+        Descendants are matched on the path boundary (the root itself or `root_path + '/'`), so /Rocket2 is
+        never treated as part of /Rocket.
+
+        Args:
+            alias (str): The alias of the entity table in the query.
+            root_path (str): The path of the subtree's root entity.
+
+        Returns:
+            tuple: The SQL condition and its parameters.
+        """
+        return f"({alias}.path = %s OR {alias}.path LIKE %s)", [root_path, f'{escape_like(root_path)}/%']
+
+    def add_entities(self, entity_ids):
+        """Indexes new entities. Their parents must already be indexed or be among `entity_ids`."""
+
+    def move_entity(self, entity_id, parent_id):
+        """Reindexes an entity and its descendants after the entity was saved under `parent_id`."""
+
+    def rebuild(self):
+        """
+        Recomputes the backend's structure for every entity from `parent_id`.
+
+        Returns:
+            int: The number of rows written.
+        """
+        return 0
+
+
+class LtreeHierarchy(PathHierarchy):
+    """
+    Selects subtrees with an ltree of ancestor ids, such as `1.2.5`, stored in `entity_entity.id_path`.
+
+    Ids are used as labels because ltree labels cannot hold arbitrary entity names, which also means renames
+    leave `id_path` untouched. The column and its GiST index are created by `install`, rather than a migration,
+    so that databases without the ltree extension can still use the other backends.
+    """
+    name = 'ltree'
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS ltree")
+            cursor.execute("ALTER TABLE entity_entity ADD COLUMN IF NOT EXISTS id_path ltree")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS entity_entity_id_path_gist ON entity_entity USING GIST (id_path)"
+            )
+
+    def subtree_filter(self, alias, root_path):
+        query = f"{alias}.id_path <@ (SELECT r.id_path FROM entity_entity r WHERE r.path = %s LIMIT 1)"
+        return query, [root_path]
+
+    def add_entities(self, entity_ids):
+        with connection.cursor() as cursor:
+            # Start from entities whose parent is already indexed and walk down through the rest
+            query = """
+                WITH RECURSIVE new_paths (id, id_path) AS (
+                    SELECT e.id, COALESCE(p.id_path, ''::ltree) || e.id::text
+                    FROM entity_entity e
+                    LEFT JOIN entity_entity p ON p.id = e.parent_id
+                    WHERE e.id = ANY(%s) AND (e.parent_id IS NULL OR NOT e.parent_id = ANY(%s))
+                    UNION ALL
+                    SELECT c.id, n.id_path || c.id::text
+                    FROM new_paths n
+                    JOIN entity_entity c ON c.parent_id = n.id
+                    WHERE c.id = ANY(%s)
+                )
+                UPDATE entity_entity e
+                SET id_path = n.id_path
+                FROM new_paths n
+                WHERE e.id = n.id
+            """
+            cursor.execute(query, [entity_ids] * 3)
+
+    def move_entity(self, entity_id, parent_id):
+        with connection.cursor() as cursor:
+            # Swap the moved entity's old ancestors for its new parent's id path, keeping the rest of each path
+            query = """
+                UPDATE entity_entity e
+                SET id_path = COALESCE((SELECT id_path FROM entity_entity WHERE id = %s), ''::ltree)
+                    || subpath(e.id_path, nlevel(moved.id_path) - 1)
+                FROM (SELECT id_path FROM entity_entity WHERE id = %s) moved
+                WHERE e.id_path <@ moved.id_path
+            """
+            cursor.execute(query, [parent_id, entity_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            query = """
+                WITH RECURSIVE tree (id, id_path) AS (
+                    SELECT id, id::text::ltree FROM entity_entity WHERE parent_id IS NULL
+                    UNION ALL
+                    SELECT e.id, tree.id_path || e.id::text
+                    FROM tree
+                    JOIN entity_entity e ON e.parent_id = tree.id
+                )
+                UPDATE entity_entity e
+                SET id_path = tree.id_path
+                FROM tree
+                WHERE e.id = tree.id
+            """
+            cursor.execute(query)
+            count = cursor.rowcount
+            cursor.execute("ANALYZE entity_entity")
+            return count
+
+
+class ClosureHierarchy(PathHierarchy):
+    """Selects subtrees through `EntityClosure`, which pairs every entity with each of its ancestors."""
+    name = 'closure'
+
+    # Pairs each entity in the selection with itself and each of its ancestors by walking up parent_id
+    chain_query = """
+        INSERT INTO entity_entityclosure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE chain (ancestor_id, descendant_id, depth) AS (
+            SELECT e.id, e.id, 0 FROM entity_entity e {where}
+            UNION ALL
+            SELECT p.parent_id, chain.descendant_id, chain.depth + 1
+            FROM chain
+            JOIN entity_entity p ON p.id = chain.ancestor_id
+            WHERE p.parent_id IS NOT NULL
+        )
+        SELECT ancestor_id, descendant_id, depth FROM chain
+    """
+
+    def subtree_filter(self, alias, root_path):
+        query = f"""{alias}.id IN (
+            SELECT c.descendant_id
+            FROM entity_entityclosure c
+            WHERE c.ancestor_id = (SELECT r.id FROM entity_entity r WHERE r.path = %s LIMIT 1)
+        )"""
+        return query, [root_path]
+
+    def add_entities(self, entity_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(self.chain_query.format(where='WHERE e.id = ANY(%s)'), [entity_ids])
+
+    def move_entity(self, entity_id, parent_id):
+        with connection.cursor() as cursor:
+            # Unlink the subtree from the moved entity's old ancestors
+            query = """
+                DELETE FROM entity_entityclosure link
+                USING entity_entityclosure old_ancestor, entity_entityclosure subtree
+                WHERE old_ancestor.descendant_id = %(id)s AND old_ancestor.ancestor_id <> %(id)s
+                    AND subtree.ancestor_id = %(id)s
+                    AND link.ancestor_id = old_ancestor.ancestor_id AND link.descendant_id = subtree.descendant_id
+            """
+            cursor.execute(query, {'id': entity_id})
+            if parent_id is None:
+                return
+            # Link it to the new parent and each of the parent's ancestors
+            query = """
+                INSERT INTO entity_entityclosure (ancestor_id, descendant_id, depth)
+                SELECT new_ancestor.ancestor_id, subtree.descendant_id, new_ancestor.depth + subtree.depth + 1
+                FROM entity_entityclosure new_ancestor, entity_entityclosure subtree
+                WHERE new_ancestor.descendant_id = %(parent_id)s AND subtree.ancestor_id = %(id)s
+                ON CONFLICT (ancestor_id, descendant_id) DO NOTHING
+            """
+            cursor.execute(query, {'id': entity_id, 'parent_id': parent_id})
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            # Delete rather than truncate, which fails while deferred foreign key checks are pending
+            cursor.execute("DELETE FROM entity_entityclosure")
+            cursor.execute(self.chain_query.format(where=''))
+            count = cursor.rowcount
+            cursor.execute("ANALYZE entity_entityclosure")
+            return count
+
+
+BACKENDS = {backend.name: backend() for backend in [PathHierarchy, LtreeHierarchy, ClosureHierarchy]}
+
+
+def get_backend(name=None):
+    """Returns the hierarchy backend called `name`, or the one selected by ENTITY_HIERARCHY_BACKEND."""
+    name = name or settings.ENTITY_HIERARCHY_BACKEND
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f'Unknown ENTITY_HIERARCHY_BACKEND {name!r}. Choose one of: {", ".join(BACKENDS)}.'
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from entity.benchmarks import SUITES
+
+
+class Command(BaseCommand):
+    help = 'Runs an entity benchmark suite. Data seeded by the suite is rolled back after each size.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=sorted(SUITES), help='Name of the benchmark suite to run.')
+        parser.add_argument('--sizes', nargs='+', type=int, help='Table sizes to run the suite at.')
+
+    def handle(self, *args, **options):
+        func, default_sizes = SUITES[options['suite']]
+        for size in options['sizes'] or default_sizes:
+            with transaction.atomic():
+                for result in func(size):
+                    self.stdout.write('  '.join(f'{key}={self._format(value)}' for key, value in result.items()))
+                # Discard seeded rows
+                transaction.set_rollback(True)
+
+    def _format(self, value):
+        if isinstance(value, float):
+            return f'{value:.4f}'
+        return str(value)
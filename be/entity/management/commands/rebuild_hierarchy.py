@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from entity.hierarchy import BACKENDS, get_backend
+
+
+class Command(BaseCommand):
+    help = 'Builds the structure of a hierarchy backend for every entity. Run after changing ENTITY_HIERARCHY_BACKEND.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend', choices=sorted(BACKENDS), help='Backend to build. Defaults to ENTITY_HIERARCHY_BACKEND.'
+        )
+
+    def handle(self, *args, **options):
+        backend = get_backend(options['backend'])
+        start_time = time.perf_counter()
+        with transaction.atomic():
+            backend.install()
+            rows = backend.rebuild()
+        seconds = time.perf_counter() - start_time
+        self.stdout.write(f'Rebuilt the {backend.name} hierarchy: {rows} rows in {seconds:.2f}s')
@@ -1,6 +1,53 @@
-from decimal import Decimal, ROUND_DOWN
-from collections import defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import models, connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from entity import cache as subtree_cache
+from entity.hierarchy import escape_like, get_backend
+
+
+def insert_rows(cursor, table, columns, rows, batch_size=None):
+    """
+    Inserts rows with multi-row INSERT statements, stamping each row's created_at and updated_at.
+
+    Args:
+        cursor (CursorWrapper): The cursor to execute the statements on.
+        table (str): The name of the table.
+        columns (list): The names of the columns supplied by each row.
+        rows (list): The rows to insert, as sequences of column values.
+        batch_size (int): The number of rows per statement. Defaults to the ENTITY_IMPORT_BATCH_SIZE setting.
+    """
+    batch_size = batch_size or settings.ENTITY_IMPORT_BATCH_SIZE
+    placeholder = f"({', '.join(['%s'] * len(columns))}, NOW(), NOW())"
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        query = f"""
+            INSERT INTO {table} ({', '.join(columns)}, created_at, updated_at)
+            VALUES {', '.join([placeholder] * len(batch))}
+        """
+        cursor.execute(query, [value for row in batch for value in row])
+
+
+def decimal_scale(value, max_scale):
+    """
+    Returns the number of decimal places a property value was written with, which it is displayed with.
+
+    Args:
+        value: The value as written, such as '1.500' or Decimal('1.500').
+        max_scale (int): The number of decimal places the value is stored with, which caps the scale.
+
+    Returns:
+        int: The scale, or None if there is no value.
+    """
+    if value is None:
+        return None
+    exponent = Decimal(str(value)).as_tuple().exponent
+    if not isinstance(exponent, int):
+        # NaN and infinities have no decimal places
+        return None
+    return min(max(0, -exponent), max_scale)
 
 
 class EntityManager(models.Manager):
@@ -13,7 +60,7 @@ class EntityManager(models.Manager):
             parent_path (str): The new base path to be applied to children..
         """
         if not old_path:
-            # Post-save signal will handle path
+            # New entities have no children yet
             return
         if not parent_path:
             raise ValueError("The parent entity must have a valid path.")
@@ -45,111 +92,483 @@ class EntityManager(models.Manager):
 
     def update_child_paths_raw(self, old_path, parent_path):
         """
-        Updates the paths of all child entities based on the parent entity's path.
+        Rewrites the paths of an entity and all of its descendants in a single statement.
+
+        Only rows at or below `old_path` are touched, and only the leading `old_path` prefix of each
+        path is replaced, so sibling trees sharing a name prefix (/Rocket and /Rocket2) and matches in
+        the middle of unrelated paths are left alone.
 
         Args:
             old_path (str): The path belonging to parent entity used to identify update candidates.
             parent_path (str): The new base path to be applied to children..
+
+        Returns:
+            int: The number of rows rewritten.
         """
         if not old_path:
-            # Post-save signal will handle path
-            return
+            # New entities have no children yet
+            return 0
         if not parent_path:
             raise ValueError("The parent entity must have a valid path.")
         # Abort method if paths match
         if old_path == parent_path:
-            return
+            return 0
 
-        with connection.cursor() as cursor:
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Move descendants' parent paths and depths along with their paths. The entity's own parent path
+            # lies outside the rewritten prefix, so it is set directly.
+            # Touch updated_at so that subtree signatures of the moved rows change
             query = """
                 UPDATE entity_entity
-                SET path = REPLACE(path, %s, %s)
+                SET path = %s || SUBSTRING(path FROM %s),
+                    parent_path = CASE WHEN path = %s THEN %s ELSE %s || SUBSTRING(parent_path FROM %s) END,
+                    depth = depth + %s,
+                    updated_at = NOW()
+                WHERE path = %s OR path LIKE %s
             """
-            cursor.execute(query, [old_path, parent_path])
+            cursor.execute(query, [
+                parent_path, len(old_path) + 1,
+                old_path, parent_path.rsplit('/', 1)[0] or None, parent_path, len(old_path) + 1,
+                parent_path.count('/') - old_path.count('/'),
+                old_path, f'{escape_like(old_path)}/%',
+            ])
+            return cursor.rowcount
 
     def update_child_trees(self, path, tree_id):
+        """
+        Moves all descendants of an entity into a tree in a single statement.
+
+        Args:
+            path (str): The path of the entity whose descendants are updated.
+            tree_id (int): The tree the descendants now belong to.
+
+        Returns:
+            int: The number of rows updated.
+        """
         if not path or not tree_id:
             raise ValueError('path and tree_id required.')
 
+        with transaction.atomic(), connection.cursor() as cursor:
+            query = """
+                UPDATE entity_entity
+                SET tree_id = %s
+                WHERE path LIKE %s AND tree_id IS DISTINCT FROM %s
+            """
+            cursor.execute(query, [tree_id, f'{escape_like(path)}/%', tree_id])
+            return cursor.rowcount
+
+    def backfill_hierarchy(self):
+        """
+        Computes `depth` and `parent_path` from `path` for entities missing them, such as rows loaded from
+        SQL written before those columns existed.
+
+        Returns:
+            int: The number of rows updated.
+        """
+        with connection.cursor() as cursor:
+            query = """
+                UPDATE entity_entity
+                SET depth = LENGTH(path) - LENGTH(REPLACE(path, '/', '')) - 1,
+                    parent_path = NULLIF(REGEXP_REPLACE(path, '/[^/]*$', ''), '')
+                WHERE path IS NOT NULL AND depth IS NULL
+            """
+            cursor.execute(query)
+            return cursor.rowcount
+
+    def next_id(self):
+        """Allocates the next entity primary key from its sequence."""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(pg_get_serial_sequence('entity_entity', 'id'))")
+            return cursor.fetchone()[0]
+
+    def next_ids(self, count):
+        """Allocates `count` entity primary keys from their sequence in a single round trip."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence('entity_entity', 'id')) FROM generate_series(1, %s)",
+                [count]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def bulk_import(self, records):
+        """
+        Creates many entities and their attributes in one transaction.
+
+        Paths, parents and tree ids are worked out in memory and rows are written with batched multi-row
+        INSERTs, so the cost per entity is a fraction of a round trip instead of a full `save()`. Records may
+        arrive in any order. Each record's parent must be another record or an existing entity, and no record
+        may overwrite an existing entity.
+
+        Args:
+            records (list): Tuples of an entity path and a dict of its properties.
+
+        Returns:
+            tuple: The number of entities and the number of attributes created.
+
+        Raises:
+            ValidationError: If a record is malformed, conflicts with an existing entity or has no parent.
+        """
+        value_field = self.model._meta.get_field('attributes').related_model._meta.get_field('value')
+        name_field = self.model._meta.get_field('name')
+        path_field = self.model._meta.get_field('path')
+        # Create parents before their children
+        records = sorted(records, key=lambda record: record[0].count('/'))
+
+        # Validate record paths
+        properties = {}
+        for path, props in records:
+            names = path.split('/')[1:]
+            if not path.startswith('/') or not all(names):
+                raise ValidationError({'path': f'Entity paths must be of the form /Root/Child: {path}'})
+            if len(path) > path_field.max_length or max(len(name) for name in names) > name_field.max_length:
+                raise ValidationError({'path': f'Entity path or name is too long: {path}'})
+            if path in properties:
+                raise ValidationError({'path': f'Entity path is not unique: {path}'})
+            properties[path] = props
+
+        # Look up existing parents and conflicting entities in one query
+        external_parents = {
+            path.rsplit('/', 1)[0] for path in properties if path.count('/') > 1
+        }.difference(properties)
+        existing = {
+            path: (entity_id, tree_id)
+            for entity_id, path, tree_id in self.filter(
+                path__in=[*properties, *external_parents]
+            ).values_list('id', 'path', 'tree_id')
+        }
+        conflicts = sorted(path for path in properties if path in existing)
+        if conflicts:
+            raise ValidationError({'path': f'Entity path is not unique: {", ".join(conflicts[:10])}'})
+        missing = sorted(path for path in external_parents if path not in existing)
+        if missing:
+            raise ValidationError({'path': f'Entity parent does not exist: {", ".join(missing[:10])}'})
+
         with transaction.atomic():
-            descendant_entities = self.select_for_update().filter(
-                path__startswith=path
-            ).exclude(path=path)
+            # Work out ids, parents and trees
+            ids = self.next_ids(len(properties)) if properties else []
+            entity_rows = []
+            attribute_rows = []
+            for entity_id, (path, props) in zip(ids, properties.items()):
+                parent_path, name = path.rsplit('/', 1)
+                if parent_path:
+                    parent_id, tree_id = existing[parent_path]
+                else:
+                    parent_id, tree_id = None, entity_id
+                existing[path] = (entity_id, tree_id)
+                depth = path.count('/') - 1
+                entity_rows.append((entity_id, name, parent_id, parent_path or None, depth, path, tree_id))
+                for key, value in props.items():
+                    try:
+                        decimal_value = value_field.to_python(value)
+                    except DjangoValidationError as e:
+                        raise ValidationError({'properties': f'{path} {key}: {e.messages[0]}'})
+                    scale = decimal_scale(value, value_field.decimal_places)
+                    attribute_rows.append((entity_id, key, decimal_value, scale))
 
-            # Prepare descendant for bulk update
-            for descendant in descendant_entities:
-                # Compute the new path
-                descendant.tree_id = tree_id
+            with connection.cursor() as cursor:
+                insert_rows(
+                    cursor, 'entity_entity', ['id', 'name', 'parent_id', 'parent_path', 'depth', 'path', 'tree_id'],
+                    entity_rows
+                )
+                insert_rows(cursor, 'entity_attribute', ['entity_id', 'key', 'value', 'scale'], attribute_rows)
+            if entity_rows:
+                get_backend().add_entities(ids)
 
-            # Perform the bulk update
-            self.bulk_update(descendant_entities, ['tree_id'])
+        # Invalidate cached subtrees the new entities were attached to
+        for parent_path in external_parents:
+            subtree_cache.invalidate(parent_path)
+        return len(entity_rows), len(attribute_rows)
 
     def path_exists(self, path):
         return [d.id for d in self.filter(path=path)]
 
-    def fetch_descendants(self, root_path):
+    def fetch_ancestors(self, path):
+        """
+        Returns the entities along a path, from the root down, with their properties.
+
+        The path of every ancestor is a prefix of `path`, so all of them are looked up by equality on the
+        path index in one query rather than by walking `parent_id` one level at a time. Entities missing from
+        the end of the path are left out, so the last entity returned is the deepest one that exists.
+
+        Args:
+            path (str): The path to walk up from. The entity at `path` itself need not exist.
+
+        Returns:
+            list: Entity dicts with their properties, root first. Empty if not even the root exists.
+        """
+        names = [name for name in path.split('/') if name]
+        prefixes = ['/' + '/'.join(names[:length]) for length in range(1, len(names) + 1)]
         with connection.cursor() as cursor:
             query = """
-                SELECT e.id AS entity_id,
-                    e.name AS entity_name,
-                    e.path AS entity_path,
-                    e.parent_id AS parent_id,
-                    a.key AS attribute_key,
-                    a.value AS attribute_value,
-                    a.str_value AS attribute_quantizer
+                SELECT e.id, e.name, e.path, a.key, TRUNC(a.value, a.scale)
                 FROM entity_entity e
                 LEFT JOIN entity_attribute a ON e.id = a.entity_id
-                WHERE e.path LIKE %s
-                ORDER BY e.path
+                WHERE e.path = ANY(%s)
+                ORDER BY e.depth, e.id
             """
-            cursor.execute(query, [f"{root_path}%"])
+            cursor.execute(query, [prefixes])
             rows = cursor.fetchall()
-        return rows
 
-    def build_tree(self, root_path):
-        rows = self.fetch_descendants(root_path)
+        entities = {}
+        for entity_id, name, entity_path, attr_key, attr_value in rows:
+            entity = entities.setdefault(entity_id, {
+                "id": entity_id,
+                "name": name,
+                "path": entity_path,
+                "properties": {}
+            })
+            if attr_key:
+                entity["properties"][attr_key] = attr_value
+        return list(entities.values())
+
+    def search(self, query, limit=10):
+        """
+        Returns the top entities matching a partial path or a name prefix, without building any trees.
+
+        A query containing '/' completes the last name of a path among the children of its parent, so
+        "Rocket/St" matches /Rocket/Stage1 and /Rocket/Stage2. Any other query matches entity names starting
+        with it anywhere in the tree. Both read a pattern index in its own order and stop after `limit`
+        entries, so the cost does not grow with the number of matches.
+
+        Args:
+            query (str): The partial path or name prefix. Matching is case-sensitive, like paths.
+            limit (int): The maximum number of entities to return.
+
+        Returns:
+            list: Entity dicts with their id, name, path and number of children, ordered by name.
+        """
+        query = query.strip()
+        if '/' in query:
+            parent_path, _, fragment = ('/' + query.lstrip('/')).rpartition('/')
+            # A single leading slash completes root names
+            filters = ["e.parent_path = %s" if parent_path else "e.parent_path IS NULL", "e.name LIKE %s"]
+            params = ([parent_path] if parent_path else []) + [f'{escape_like(fragment)}%']
+        else:
+            filters = ["e.name LIKE %s"]
+            params = [f'{escape_like(query)}%']
+        with connection.cursor() as cursor:
+            sql = f"""
+                SELECT e.id, e.name, e.path, (SELECT COUNT(*) FROM entity_entity c WHERE c.parent_id = e.id)
+                FROM entity_entity e
+                WHERE {' AND '.join(filters)}
+                ORDER BY e.name USING ~<~, e.path USING ~<~
+                LIMIT %s
+            """
+            cursor.execute(sql, params + [limit])
+            return [
+                {"id": entity_id, "name": name, "path": path, "child_count": child_count}
+                for entity_id, name, path, child_count in cursor.fetchall()
+            ]
+
+    def subtree_signature(self, root_path):
+        """
+        Summarizes the rows of a subtree cheaply enough to tell whether it changed without building it.
+
+        Every write to an entity or attribute bumps its `updated_at` and every insert or delete changes a
+        count, so any change to the subtree changes the signature.
+
+        Args:
+            root_path (str): The path of the subtree's root entity.
+
+        Returns:
+            tuple: The entity count, latest entity update, attribute count and latest attribute update.
+                The entity count is 0 when no entity exists at `root_path`.
+        """
+        subtree_filter, params = get_backend().subtree_filter('e', root_path)
+        with connection.cursor() as cursor:
+            query = f"""
+                SELECT COUNT(DISTINCT e.id), MAX(e.updated_at), COUNT(a.id), MAX(a.updated_at)
+                FROM entity_entity e
+                LEFT JOIN entity_attribute a ON e.id = a.entity_id
+                WHERE {subtree_filter}
+            """
+            cursor.execute(query, params)
+            return cursor.fetchone()
+
+    def fetch_descendants(self, root_path, depth=None, max_nodes=None, batch_size=None):
+        """
+        Yields an entity and its descendants joined with their attributes, one row per attribute.
+
+        Rows are read from a server-side cursor in batches, so consumers like `build_tree` and the streaming
+        renderers process them as they arrive instead of holding the whole result in memory.
+
+        Args:
+            root_path (str): The path of the subtree's root entity.
+            depth (int): The number of levels below the root to include. Includes all levels if omitted.
+            max_nodes (int): The maximum number of entities to include, filled breadth-first.
+            batch_size (int): The number of rows fetched per round trip. Defaults to the
+                ENTITY_FETCH_BATCH_SIZE setting.
+        """
+        batch_size = batch_size or settings.ENTITY_FETCH_BATCH_SIZE
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(*self.descendants_query(root_path, depth, max_nodes))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+
+    def descendants_query(self, root_path, depth=None, max_nodes=None):
+        """
+        Builds the query returning an entity and its descendants joined with their attributes.
+
+        Descendants are selected by the configured hierarchy backend, which with the default `path` backend
+        matches the path boundary (the root itself or `root_path + '/'`) so that /Rocket2 is never treated as
+        part of /Rocket. Rows are ordered depth-first so that every subtree is contiguous. A plain path sort
+        does not guarantee that when names contain characters that sort before '/', so paths are compared name
+        by name as arrays, which keeps siblings in the database collation's order.
+
+        When the subtree is limited by `depth` or `max_nodes`, each row also carries the entity's total
+        number of children so that truncated entities can be marked; otherwise that column is NULL. Depth
+        limits filter on the precomputed `depth` column, and a root with only its children is read through the
+        index on `parent_path`. Attribute values are truncated to their display scale by the database, so they
+        arrive ready to render.
+
+        Args:
+            root_path (str): The path of the subtree's root entity.
+            depth (int): The number of levels below the root to include.
+            max_nodes (int): The maximum number of entities to include, filled breadth-first.
 
-        # Prepare entity and attribute receptacles
+        Returns:
+            tuple: The SQL string and its parameters.
+        """
+        root_depth = root_path.count('/') - 1
+        if depth is not None and depth <= 1:
+            # Select the root and its children by equality instead of scanning the whole subtree
+            filters = ["(e.path = %s OR e.parent_path = %s)" if depth else "e.path = %s"]
+            params = [root_path, root_path] if depth else [root_path]
+        else:
+            subtree_filter, params = get_backend().subtree_filter('e', root_path)
+            filters = [subtree_filter]
+            if depth is not None:
+                filters.append("e.depth <= %s")
+                params.append(root_depth + depth)
+        limit = ""
+        if max_nodes is not None:
+            # Fill breadth-first so that every included entity's ancestors are included too
+            limit = "ORDER BY e.depth, e.path LIMIT %s"
+            params.append(max_nodes)
+        limited = depth is not None or max_nodes is not None
+        # Counted once per entity in the CTE rather than once per attribute row
+        child_count = (
+            "(SELECT COUNT(*) FROM entity_entity c WHERE c.parent_id = e.id)" if limited else "NULL::bigint"
+        )
+
+        query = f"""
+            WITH nodes AS (
+                SELECT e.id, e.name, e.path, e.parent_id, {child_count} AS child_count
+                FROM entity_entity e
+                WHERE {' AND '.join(filters)}
+                {limit}
+            )
+            SELECT e.id AS entity_id,
+                e.name AS entity_name,
+                e.path AS entity_path,
+                e.parent_id AS parent_id,
+                a.key AS attribute_key,
+                TRUNC(a.value, a.scale) AS attribute_value,
+                e.child_count AS child_count
+            FROM nodes e
+            LEFT JOIN entity_attribute a ON e.id = a.entity_id
+            ORDER BY string_to_array(e.path, '/')
+        """
+        return query, params
+
+    def build_tree(self, root_path, depth=None, max_nodes=None):
+        rows = self.fetch_descendants(root_path, depth=depth, max_nodes=max_nodes)
+        return self.assemble_tree(rows, root_path)
+
+    def assemble_tree(self, rows, root_path):
+        """
+        Links the rows returned by `fetch_descendants` into a nested subtree in a single pass.
+
+        Each entity is created once, on its first row, and attached to its parent through `parent_id`;
+        properties are added to it as the remaining rows for that entity stream in. Rows must list every
+        parent before its children, which ordering by path guarantees. For depth or node limited rows, each
+        entity gets a `has_more` flag telling whether some of its children were left out.
+
+        Args:
+            rows (iterable): Entity/attribute rows as yielded by `fetch_descendants`.
+            root_path (str): The path of the subtree's root entity.
+
+        Returns:
+            dict: The root entity with nested descendants, or an empty dict if the root was not found.
+        """
         entities = {}
-        attributes = defaultdict(lambda: defaultdict(Decimal))  # Use Decimal for precision
-
-        for row in rows:
-            # Break up row into fields
-            entity_id, name, path, parent_id, attr_key, attr_value, attr_quantizer = row
-            # Ensure each entity is in the dictionary
-            if entity_id not in entities:
-                # Save entity using path as key
-                entities[path] = {
+        child_counts = []
+        tree = {}
+
+        for entity_id, name, path, parent_id, attr_key, attr_value, child_count in rows:
+            entity = entities.get(entity_id)
+            if entity is None:
+                entity = entities[entity_id] = {
                     "id": entity_id,
                     "name": name,
                     "path": path,
                     "properties": {},
                     "descendants": []
                 }
+                if child_count is not None:
+                    child_counts.append((entity, child_count))
+                if path == root_path:
+                    # Handle root node
+                    tree = entity
+                else:
+                    # Add to parent's descendants
+                    parent = entities.get(parent_id)
+                    if parent is not None:
+                        parent["descendants"].append(entity)
 
-            # Add attributes to the corresponding entity
+            # Add attributes to the entity
             if attr_key:
-                attributes[path][attr_key] = attr_value.quantize(
-                    Decimal(attr_quantizer), rounding=ROUND_DOWN
-                ) if attr_value and attr_quantizer else None
+                entity["properties"][attr_key] = attr_value
 
-        # Merge attributes into entities
-        for entity_path, props in attributes.items():
-            if entity_path in entities:
-                entities[entity_path]["properties"] = props
-
-        # Construct the subtree
-        tree = {}
-        for entity in entities.values():
-            if entity["path"] == root_path:
-                # Handle root node
-                tree = entity
-            else:
-                # Add to parent's descendants
-                parent_path = "/".join(entity["path"].split("/")[:-1])
-                # Look up parent by path
-                parent = entities.get(parent_path)
-                if parent:
-                    parent["descendants"].append(entity)
+        # Mark entities whose children were cut off by a limit
+        for entity, child_count in child_counts:
+            entity["has_more"] = child_count > len(entity["descendants"])
 
         return tree
+
+
+class AttributeManager(models.Manager):
+    def bulk_upsert(self, entity, values):
+        """
+        Creates or updates all of an entity's attributes in a single statement.
+
+        Conflicts are resolved on the unique_entity_key constraint, so existing keys have their value replaced.
+        Values are converted like `Attribute.save` would, keeping the number of decimal places written as the
+        display scale.
+
+        Args:
+            entity (Entity): The entity the attributes belong to.
+            values (dict): Attribute values by key.
+
+        Returns:
+            int: The number of attributes created or updated.
+
+        Raises:
+            ValidationError: If a value is not a decimal number.
+        """
+        if not values:
+            return 0
+
+        value_field = self.model._meta.get_field('value')
+        params = []
+        for key, value in values.items():
+            decimal_value = value_field.to_python(value)
+            params.extend([entity.id, key, decimal_value, decimal_scale(value, value_field.decimal_places)])
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            rows = ', '.join(["(%s, %s, %s, %s, NOW(), NOW())"] * len(values))
+            query = f"""
+                INSERT INTO entity_attribute (entity_id, key, value, scale, created_at, updated_at)
+                VALUES {rows}
+                ON CONFLICT (entity_id, key) WHERE entity_id IS NOT NULL AND key IS NOT NULL
+                DO UPDATE SET value = EXCLUDED.value, scale = EXCLUDED.scale, updated_at = EXCLUDED.updated_at
+            """
+            cursor.execute(query, params)
+            count = cursor.rowcount
+
+        # Invalidate cached subtrees containing these attributes
+        subtree_cache.invalidate(entity.path)
+        return count
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entity', '0016_attribute_str_value'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entity',
+            name='depth',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='entity',
+            name='parent_path',
+            field=models.CharField(blank=True, max_length=2048, null=True),
+        ),
+        # Backfill existing entities before indexing parent_path, so the index is built once
+        migrations.RunSQL(
+            """
+            UPDATE entity_entity
+            SET depth = LENGTH(path) - LENGTH(REPLACE(path, '/', '')) - 1,
+                parent_path = NULLIF(REGEXP_REPLACE(path, '/[^/]*$', ''), '')
+            WHERE path IS NOT NULL
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='entity',
+            name='parent_path',
+            field=models.CharField(blank=True, db_index=True, max_length=2048, null=True),
+        ),
+    ]
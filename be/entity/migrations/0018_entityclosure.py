@@ -0,0 +1,36 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entity', '0017_entity_depth_parent_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntityClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='+',
+                    to='entity.entity'
+                )),
+                ('descendant', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='+',
+                    to='entity.entity'
+                )),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_ancestor_descendant')
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entity', '0018_entityclosure'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entity',
+            index=models.Index(
+                fields=['parent_path', 'name'],
+                name='entity_parent_path_name_like',
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='entity',
+            index=models.Index(
+                fields=['name', 'path'],
+                name='entity_name_path_like',
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entity', '0019_entity_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attribute',
+            name='scale',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        # Allow nulls first so that unapplying re-adds the column empty and fills it before requiring values
+        migrations.AlterField(
+            model_name='attribute',
+            name='str_value',
+            field=models.CharField(max_length=31, null=True),
+        ),
+        # Count the decimal places of the text each value was written with, skipping text that is not a number
+        migrations.RunSQL(
+            sql=r"""
+                UPDATE entity_attribute
+                SET scale = LEAST(SCALE(TRIM(str_value)::numeric), 10)
+                WHERE value IS NOT NULL
+                    AND TRIM(str_value) ~ '^[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?$'
+            """,
+            reverse_sql="UPDATE entity_attribute SET str_value = COALESCE(TRUNC(value, scale)::text, 'None')",
+        ),
+        migrations.RemoveField(
+            model_name='attribute',
+            name='str_value',
+        ),
+    ]
@@ -1,14 +1,19 @@
 from decimal import Decimal, ROUND_DOWN
-from django.db import models
+from django.db import models, transaction
 from rest_framework.exceptions import ValidationError
 
-from entity.managers import EntityManager
+from entity import cache as subtree_cache
+from entity.hierarchy import get_backend
+from entity.managers import AttributeManager, EntityManager, decimal_scale
 
 
 class Entity(models.Model):
     name = models.CharField(max_length=256, null=False, blank=False, db_index=True)
     parent = models.ForeignKey(to='self', null=True, blank=True, on_delete=models.SET_NULL, related_name='descendants')
     path = models.CharField(max_length=2048, null=True, blank=True, db_index=True)
+    # Precomputed from path so that levels and children can be selected without parsing paths
+    parent_path = models.CharField(max_length=2048, null=True, blank=True, db_index=True)
+    depth = models.PositiveIntegerField(null=True, blank=True)
     tree_id = models.IntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -24,6 +29,19 @@ class Entity(models.Model):
                 name='unique_parent_path'
             )
         ]
+        # Pattern indexes serve name prefix searches already sorted, so the top matches are read without a sort
+        indexes = [
+            models.Index(
+                fields=['parent_path', 'name'],
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops'],
+                name='entity_parent_path_name_like'
+            ),
+            models.Index(
+                fields=['name', 'path'],
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops'],
+                name='entity_name_path_like'
+            )
+        ]
 
     def save(self, *args, **kwargs):
         # Handle entity path
@@ -40,14 +58,62 @@ class Entity(models.Model):
                                 'descendant node, its name must be unique among its siblings'
                     }
                 })
-        # Update child paths
-        Entity.objects.update_child_paths_raw(old_path, self.path)
-
-        # Save the object
-        super().save(*args, **kwargs)
-
-    def subtree(self):
-        return Entity.objects.build_tree(self.path)
+        # Handle hierarchy columns
+        self.parent_path = self.parent.path if self.parent is not None else None
+        self.depth = self.path.count('/') - 1
+        # Handle tree membership
+        old_tree_id = self.tree_id
+        if self.parent is not None:
+            self.tree_id = self.parent.tree_id
+        else:
+            if self.id is None:
+                # Allocate the primary key up front so that a new root can reference itself in its INSERT
+                self.id = Entity.objects.next_id()
+                kwargs['force_insert'] = True
+            self.tree_id = self.id
+        # Rewrite descendants in the same transaction as the entity, without a savepoint when nested
+        with transaction.atomic(savepoint=False):
+            # Update child paths
+            Entity.objects.update_child_paths_raw(old_path, self.path)
+            # Update child trees
+            if old_path and old_tree_id != self.tree_id:
+                Entity.objects.update_child_trees(self.path, self.tree_id)
+
+            # Save the object
+            super().save(*args, **kwargs)
+
+            # Update the hierarchy backend's index of new and moved entities
+            if not old_path:
+                get_backend().add_entities([self.id])
+            elif old_path.rsplit('/', 1)[0] != (self.parent_path or ''):
+                get_backend().move_entity(self.id, self.parent_id)
+
+        # Invalidate cached subtrees containing this entity
+        if old_path and old_path != self.path:
+            subtree_cache.invalidate_moved(old_path, self.path)
+        else:
+            subtree_cache.invalidate(self.path)
+
+    def delete(self, *args, **kwargs):
+        subtree_cache.invalidate(self.path)
+        return super().delete(*args, **kwargs)
+
+    def subtree(self, depth=None, max_nodes=None):
+        return subtree_cache.get_or_build(
+            self.path,
+            lambda: Entity.objects.build_tree(self.path, depth=depth, max_nodes=max_nodes),
+            depth=depth,
+            max_nodes=max_nodes
+        )
+
+    def node(self):
+        """Returns the entity and its properties without descendants."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'path': self.path,
+            'properties': self.get_attributes(),
+        }
 
     def _generate_name_path(self):
         # Base case
@@ -57,14 +123,21 @@ class Entity(models.Model):
         return f'{self.parent.path}/{self.name}'
 
     def _repr(self, root=False):
+        """
+        Returns the entity with its properties and nested descendants.
+
+        The subtree is read with the single query behind `build_tree` rather than one query per entity, and the
+        parent's name is taken from `parent_path` rather than loaded.
+        """
+        tree = Entity.objects.build_tree(self.path)
         data = {}
         data['id'] = self.id
         data['name'] = self.name
         data['path'] = self.path
         if root:
-            data['parent'] = self.parent.name if self.parent is not None else None
-        data['properties'] = self.get_attributes()
-        data['descendants'] = [x._repr() for x in self.descendants.prefetch_related('descendants')]
+            data['parent'] = self.parent_path.rsplit('/', 1)[1] if self.parent_path else None
+        data['properties'] = tree.get('properties', {})
+        data['descendants'] = tree.get('descendants', [])
 
         return data
 
@@ -72,17 +145,33 @@ class Entity(models.Model):
         return f'{self.name}: {self.path}'
 
     def get_attributes(self):
+        # Reads attributes loaded with prefetch_related('attributes') instead of querying when present
         return {a.key: a.get_value() for a in self.attributes.all()}
 
 
+class EntityClosure(models.Model):
+    """Pairs an entity with itself and each of its ancestors for the `closure` hierarchy backend."""
+    ancestor = models.ForeignKey(to=Entity, on_delete=models.CASCADE, related_name='+')
+    descendant = models.ForeignKey(to=Entity, on_delete=models.CASCADE, related_name='+')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_ancestor_descendant')
+        ]
+
+
 class Attribute(models.Model):
     entity = models.ForeignKey(to=Entity, null=False, blank=False, on_delete=models.CASCADE, related_name='attributes')
     key = models.CharField(max_length=256, null=True, blank=True)
     value = models.DecimalField(max_digits=20, decimal_places=10, null=True, blank=True)
-    str_value = models.CharField(max_length=31)
+    # Number of decimal places the value was written with, which it is displayed with
+    scale = models.PositiveSmallIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AttributeManager()
+
     class Meta:
         ordering = ['id']
         constraints = [
@@ -93,14 +182,36 @@ class Attribute(models.Model):
             )
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the entity the attribute was read with, so that moving it also invalidates that entity's subtrees
+        instance._loaded_entity_id = instance.__dict__.get('entity_id')
+        return instance
+
     def save(self, *args, **kwargs):
-        self.str_value = str(self.value)
+        self.scale = decimal_scale(self.value, self._meta.get_field('value').decimal_places)
 
         # Save the object
         super().save(*args, **kwargs)
 
+        # Invalidate cached subtrees containing this attribute, and those it was moved out of
+        subtree_cache.invalidate(self.entity.path)
+        loaded_entity_id = getattr(self, '_loaded_entity_id', None)
+        if loaded_entity_id is not None and loaded_entity_id != self.entity_id:
+            old_path = Entity.objects.filter(pk=loaded_entity_id).values_list('path', flat=True).first()
+            if old_path:
+                subtree_cache.invalidate(old_path)
+        self._loaded_entity_id = self.entity_id
+
+    def delete(self, *args, **kwargs):
+        subtree_cache.invalidate(self.entity.path)
+        return super().delete(*args, **kwargs)
+
     def get_value(self):
-        return self.value.quantize(Decimal(self.str_value), rounding=ROUND_DOWN)
+        if self.value is None or self.scale is None:
+            return None
+        return self.value.quantize(Decimal(1).scaleb(-self.scale), rounding=ROUND_DOWN)
 
     def as_dict(self):
         return {self.key: self.get_value()}
@@ -0,0 +1,59 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class CountingCursorPagination(CursorPagination):
+    """
+    Pages through a list by seeking past the last row of the previous page instead of skipping rows with OFFSET,
+    so deep pages cost the same as the first one.
+
+    Responses include the total `count`, like the page number pagination they replace, unless the client passes
+    `count=false` to skip counting the whole table on every page.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    count_query_param = 'count'
+    count_query_description = 'Set to false to omit the total count, which is read with a full table count.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Count before the cursor narrows the queryset
+        self.count = None
+        if request.query_params.get(self.count_query_param, None) != 'false':
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data}
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties'] = {
+            'count': {'type': 'integer', 'example': 123},
+            **response_schema['properties']
+        }
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [{
+            'name': self.count_query_param,
+            'required': False,
+            'in': 'query',
+            'description': self.count_query_description,
+            'schema': {'type': 'boolean'},
+        }]
+
+
+class EntityCursorPagination(CountingCursorPagination):
+    """
+    Pages entities in path order. The cursor seeks on path, and entities sharing a path are kept in id order by
+    an offset within the cursor.
+    """
+    ordering = ('path', 'id')
+
+
+class AttributeCursorPagination(CountingCursorPagination):
+    """Pages attributes in id order."""
+    ordering = 'id'
@@ -0,0 +1,41 @@
+import codecs
+from decimal import Decimal
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils import json
+
+
+class DecimalJSONParser(JSONParser):
+    """Parses JSON with numbers read as decimals, so that property values keep their precision."""
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        try:
+            decoded_stream = codecs.getreader(encoding)(stream)
+            parse_constant = json.strict_constant if self.strict else None
+            return json.load(decoded_stream, parse_float=Decimal, parse_constant=parse_constant)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class NDJSONParser(BaseParser):
+    """Parses newline-delimited JSON into a list with one item per non-blank line."""
+    media_type = 'application/x-ndjson'
+    strict = JSONParser.strict
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        parse_constant = json.strict_constant if self.strict else None
+
+        records = []
+        line_number = 0
+        try:
+            for line_number, line in enumerate(codecs.getreader(encoding)(stream), start=1):
+                if line.strip():
+                    records.append(json.loads(line, parse_float=Decimal, parse_constant=parse_constant))
+        except ValueError as exc:
+            raise ParseError('NDJSON parse error on line %d - %s' % (line_number, str(exc)))
+        return records
@@ -0,0 +1,105 @@
+import json
+from decimal import Decimal
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.compat import INDENT_SEPARATORS, LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from entity.streaming import escape_separators, stream_csv, stream_ndjson
+
+# Optional faster JSON encoder (pip install orjson), used by SubtreeJSONRenderer when ENTITY_JSON_ENCODER is orjson
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class PreciseJSONEncoder(JSONEncoder):
+    """Encodes Decimals as strings that keep their precision instead of as floats."""
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return str(obj)
+        return super().default(obj)
+
+
+class SubtreeJSONRenderer(JSONRenderer):
+    """
+    Renders subtrees with property values as numbers, or as precise strings when requested with `?precise=true`.
+
+    Decimals are converted by the encoder as it reaches them, so the data is neither walked beforehand nor
+    modified. Compact responses are encoded with orjson instead of the standard library when the
+    ENTITY_JSON_ENCODER setting is `orjson`. Both encode the same values, except that orjson writes non-finite
+    floats as null where STRICT_JSON rejects them. Subtree property values are always finite decimals.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        request = renderer_context.get('request', None)
+        # Read the query string from GET, which Django requests share with DRF requests
+        precise = request is not None and request.GET.get('precise', None) == 'true'
+        # Decimal's own methods are called by the encoders without a Python frame. Any other type makes them
+        # raise TypeError, and the data is then encoded again with DRF's encoder.
+        convert = Decimal.__str__ if precise else Decimal.__float__
+        encoder_class = PreciseJSONEncoder if precise else self.encoder_class
+        indent = self.get_indent(accepted_media_type, renderer_context)
+
+        if self._use_orjson() and indent is None and self.compact and not self.ensure_ascii:
+            # Leave dates and dataclasses to DRF's encoder so that they are formatted the same way
+            option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+            try:
+                return escape_separators(orjson.dumps(data, default=convert, option=option))
+            except orjson.JSONEncodeError:
+                return escape_separators(orjson.dumps(data, default=encoder_class().default, option=option))
+
+        if indent is None:
+            separators = SHORT_SEPARATORS if self.compact else LONG_SEPARATORS
+        else:
+            separators = INDENT_SEPARATORS
+        options = {'indent': indent, 'ensure_ascii': self.ensure_ascii, 'allow_nan': not self.strict,
+                   'separators': separators}
+        try:
+            content = json.dumps(data, default=convert, **options)
+        except TypeError:
+            content = json.dumps(data, cls=encoder_class, **options)
+        return escape_separators(content.encode('utf-8'))
+
+    def _use_orjson(self):
+        encoder = settings.ENTITY_JSON_ENCODER
+        if encoder not in ('json', 'orjson'):
+            raise ImproperlyConfigured(f'Unknown ENTITY_JSON_ENCODER {encoder!r}. Choose one of: json, orjson.')
+        if encoder == 'orjson' and orjson is None:
+            raise ImproperlyConfigured('ENTITY_JSON_ENCODER is orjson, but orjson is not installed.')
+        return encoder == 'orjson'
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Renders flat records as newline-delimited JSON, one record per line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        records = data if isinstance(data, list) else [data]
+        return b''.join(self.stream(records))
+
+    def stream(self, records, fields=None):
+        """Yields records as chunks for a streaming response. Records are written with all of their keys."""
+        return stream_ndjson(records)
+
+
+class CSVRenderer(BaseRenderer):
+    """Renders flat records as CSV with a header row."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        records = data if isinstance(data, list) else [data]
+        fields = list(records[0].keys()) if records else []
+        return b''.join(self.stream(records, fields))
+
+    def stream(self, records, fields):
+        """Yields the `fields` of each record as chunks for a streaming response."""
+        return stream_csv(records, fields)
@@ -25,7 +25,7 @@ class EntitySerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
 
-        # Save the instance explicitly to trigger the post_save signal
+        # Save the instance explicitly so that paths and trees are updated
         instance.save()
 
         return instance
@@ -88,28 +88,19 @@ class GenericEASerializer(serializers.ModelSerializer):
         parent = self.context.get('parent_entity')
         with transaction.atomic():
             entity = Entity.objects.create(parent=parent, name=name)
-        return entity.subtree()
+        return self._acknowledge(entity)
 
     def _handle_create_or_update_attribute(self, dynamic_dict, context):
         path = context.get('path')
         entity = Entity.objects.get(path=path)
-        # Create attribute for each key/value pair provided
-        with transaction.atomic():
-            for key, value in dynamic_dict.items():
-                attribute_queryset = Attribute.objects.filter(entity=entity, key=key)
-                if not attribute_queryset.exists():
-                    Attribute.objects.create(
-                        entity=entity,
-                        key=key,
-                        value=value
-                    )
-                else:
-                    attribute = attribute_queryset.first()
-                    attribute.key = key
-                    attribute.value = value
-                    attribute.save()
-
-        entity.refresh_from_db()
+        # Create or update all attributes in a single statement
+        Attribute.objects.bulk_upsert(entity, dynamic_dict)
+        return self._acknowledge(entity)
+
+    def _acknowledge(self, entity):
+        # Skip building the subtree when the client only asked for the written node
+        if self.context.get('minimal', False):
+            return entity.node()
         return entity.subtree()
 
 
@@ -146,6 +137,39 @@ class GenericEAInputSerializer(serializers.Serializer):
     )
 
 
+class SubtreeQuerySerializer(serializers.Serializer):
+    depth = serializers.IntegerField(
+        min_value=0,
+        required=False,
+        help_text='Number of levels below the node to include.'
+    )
+    max_nodes = serializers.IntegerField(
+        min_value=1,
+        required=False,
+        help_text='Maximum number of nodes to include, filled level by level.'
+    )
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(
+        max_length=2048,
+        help_text='Partial path, such as "Rocket/St", or the start of a name.'
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=50,
+        default=10,
+        help_text='Maximum number of matches to return.'
+    )
+
+
+class SearchResultSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    path = serializers.CharField()
+    child_count = serializers.IntegerField()
+
+
 class GenericEASubtreeSerializer(serializers.Serializer):
     id = serializers.IntegerField()
     name = serializers.CharField()
@@ -158,3 +182,17 @@ class GenericEASubtreeSerializer(serializers.Serializer):
         # Generate descendants recursively based on the current object
         descendants = obj.get('descendants', [])
         return GenericEASubtreeSerializer(descendants, many=True).data
+
+
+class GenericEANodeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    path = serializers.CharField()
+    properties = serializers.DictField()
+
+
+class GenericEAAncestorsSerializer(serializers.Serializer):
+    path = serializers.CharField(help_text='The requested path.')
+    found = serializers.BooleanField(help_text='Whether an entity exists at the requested path.')
+    nearest = GenericEANodeSerializer(help_text='The deepest existing entity on the path.')
+    ancestors = GenericEANodeSerializer(many=True, help_text='The existing entities on the path, root first.')
@@ -0,0 +1,216 @@
+"""Incremental encoders that write subtrees straight from database rows without building them in memory."""
+import csv
+from asgiref.sync import sync_to_async
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ChunkWriter:
+    """Collects small string fragments and releases them as byte chunks of roughly `CHUNK_SIZE`."""
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
+
+    def write(self, value):
+        self.parts.append(value)
+        self.size += len(value)
+
+    def full(self):
+        return self.size >= self.chunk_size
+
+    def flush(self):
+        chunk = ''.join(self.parts).encode('utf-8')
+        self.parts = []
+        self.size = 0
+        return chunk
+
+
+def group_entities(rows, precise=False):
+    """
+    Collapses consecutive entity/attribute rows from `fetch_descendants` into one dict per entity.
+
+    Args:
+        rows (iterable): Rows as yielded by `EntityManager.fetch_descendants`.
+        precise (bool): Whether property values are emitted as precise strings instead of numbers.
+    """
+    entity = None
+    for entity_id, name, path, parent_id, attr_key, attr_value, child_count in rows:
+        if entity is None or entity['id'] != entity_id:
+            if entity is not None:
+                yield entity
+            entity = {
+                'id': entity_id,
+                'name': name,
+                'path': path,
+                'parent_id': parent_id,
+                'child_count': child_count,
+                'properties': {}
+            }
+        if attr_key:
+            # Values arrive truncated to their display scale, so each is formatted once here or by the encoder
+            entity['properties'][attr_key] = str(attr_value) if precise and attr_value is not None else attr_value
+    if entity is not None:
+        yield entity
+
+
+def stream_subtree(rows, root_path, precise=False):
+    """
+    Yields a subtree as UTF-8 JSON chunks with the same shape and formatting as the rendered `build_tree` output.
+
+    Rows must arrive in depth-first order so that each node's descendants can be closed as soon as a row
+    outside of them is read. Like `build_tree`, entities whose parent is not part of the subtree are skipped.
+
+    Args:
+        rows (iterable): Rows as yielded by `EntityManager.fetch_descendants`.
+        root_path (str): The path of the subtree's root entity.
+        precise (bool): Whether property values are emitted as precise strings instead of numbers.
+    """
+    encoder = JSONEncoder(
+        ensure_ascii=not api_settings.UNICODE_JSON,
+        allow_nan=not api_settings.STRICT_JSON,
+        separators=(',', ':') if api_settings.COMPACT_JSON else (', ', ': '),
+    )
+    writer = ChunkWriter()
+    # Entities whose descendants array is still open, each as [id, descendants_written, child_count]
+    stack = []
+    open_ids = set()
+    root_written = False
+
+    def close(frame):
+        open_ids.discard(frame[0])
+        if frame[2] is None:
+            return ']}'
+        has_more = 'true' if frame[2] > frame[1] else 'false'
+        return f']{encoder.item_separator}"has_more"{encoder.key_separator}{has_more}}}'
+
+    for entity in group_entities(rows, precise):
+        if not root_written:
+            if entity['path'] != root_path:
+                continue
+            root_written = True
+        elif entity['parent_id'] not in open_ids:
+            continue
+        else:
+            # Close every node that is not the entity's parent
+            while stack[-1][0] != entity['parent_id']:
+                writer.write(close(stack.pop()))
+            if stack[-1][1]:
+                writer.write(encoder.item_separator)
+            stack[-1][1] += 1
+
+        head = encoder.encode({
+            'id': entity['id'],
+            'name': entity['name'],
+            'path': entity['path'],
+            'properties': entity['properties'],
+        })
+        # Reopen the encoded object to append its descendants
+        writer.write(f'{head[:-1]}{encoder.item_separator}"descendants"{encoder.key_separator}[')
+        stack.append([entity['id'], 0, entity['child_count']])
+        open_ids.add(entity['id'])
+
+        if writer.full():
+            yield escape_separators(writer.flush())
+
+    while stack:
+        writer.write(close(stack.pop()))
+    if not root_written:
+        writer.write('{}')
+    yield escape_separators(writer.flush())
+
+
+def subtree_records(rows, root_path, precise=False):
+    """
+    Yields a subtree as flat records with one record per attribute, or one per entity without attributes.
+
+    Each record holds the entity's `id`, `parent_id`, `path`, `depth` below the root, and an attribute `key`
+    and `value`. Like `stream_subtree`, entities whose parent is not part of the subtree are skipped. Only the
+    ancestors of the current entity are kept, so memory is bounded by the tree's depth rather than its size.
+
+    Args:
+        rows (iterable): Rows as yielded by `EntityManager.fetch_descendants`, in depth-first order.
+        root_path (str): The path of the subtree's root entity.
+        precise (bool): Whether property values are emitted as precise strings instead of numbers.
+    """
+    # Ids of the current entity's ancestors, root first
+    stack = []
+    open_ids = set()
+
+    for entity in group_entities(rows, precise):
+        if not stack:
+            if entity['path'] != root_path:
+                continue
+        elif entity['parent_id'] not in open_ids:
+            continue
+        else:
+            # Close every node that is not the entity's parent
+            while stack[-1] != entity['parent_id']:
+                open_ids.discard(stack.pop())
+
+        record = {
+            'id': entity['id'],
+            'parent_id': entity['parent_id'],
+            'path': entity['path'],
+            'depth': len(stack),
+        }
+        stack.append(entity['id'])
+        open_ids.add(entity['id'])
+
+        if not entity['properties']:
+            yield {**record, 'key': None, 'value': None}
+        for key, value in entity['properties'].items():
+            yield {**record, 'key': key, 'value': value}
+
+
+def stream_ndjson(records):
+    """Yields records as UTF-8 newline-delimited JSON chunks."""
+    encoder = JSONEncoder(
+        ensure_ascii=not api_settings.UNICODE_JSON,
+        allow_nan=not api_settings.STRICT_JSON,
+        separators=(',', ':'),
+    )
+    writer = ChunkWriter()
+    for record in records:
+        writer.write(encoder.encode(record))
+        writer.write('\n')
+        if writer.full():
+            yield writer.flush()
+    yield writer.flush()
+
+
+def stream_csv(records, fields):
+    """Yields records as UTF-8 CSV chunks with a header row of `fields`."""
+    writer = ChunkWriter()
+    # csv.writer writes each row to the chunk writer
+    rows = csv.writer(writer)
+    rows.writerow(fields)
+    for record in records:
+        rows.writerow([record[field] for field in fields])
+        if writer.full():
+            yield writer.flush()
+    yield writer.flush()
+
+
+async def iterate_in_thread(iterator):
+    """
+    Yields the items of a synchronous iterator to an asynchronous streaming response.
+
+    Items are produced through a thread-sensitive `sync_to_async`, so a server-side cursor behind the iterator is
+    always advanced on the thread that opened it.
+    """
+    advance = sync_to_async(next)
+    done = object()
+    while True:
+        item = await advance(iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+def escape_separators(chunk):
+    """Escapes the line and paragraph separators that are invalid in JavaScript, like JSONRenderer does."""
+    return chunk.replace('\u2028'.encode('utf-8'), b'\\u2028').replace('\u2029'.encode('utf-8'), b'\\u2029')
@@ -0,0 +1,55 @@
+import json
+from decimal import Decimal
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from entity.models import Attribute, Entity
+
+
+class AncestorsTestCase(APITestCase):
+    def setUp(self):
+        # Create test entities
+        self.rocket = Entity.objects.create(name='Rocket')
+        self.stage1 = Entity.objects.create(name='Stage1', parent=self.rocket)
+        self.engine1 = Entity.objects.create(name='Engine1', parent=self.stage1)
+        Attribute.objects.create(entity=self.rocket, key='Height', value=Decimal('18.000'))
+        Attribute.objects.create(entity=self.engine1, key='Thrust', value=Decimal('9.493'))
+        # Create an unrelated tree sharing a name prefix
+        Entity.objects.create(name='Rocket2')
+
+    def _ancestors(self, path, **params):
+        return self.client.get(reverse('ancestors', kwargs={'path': path}), params)
+
+    def test_ancestors(self):
+        """Test that every entity along an existing path is returned root first with its properties."""
+        response = self._ancestors('Rocket/Stage1/Engine1', precise='true')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['found'])
+        self.assertEqual(response.data['path'], '/Rocket/Stage1/Engine1')
+        self.assertEqual([entity['path'] for entity in response.data['ancestors']], [
+            '/Rocket', '/Rocket/Stage1', '/Rocket/Stage1/Engine1'
+        ])
+        # Precise values are converted as the response is encoded
+        content = json.loads(response.content)
+        self.assertEqual(content['ancestors'][0]['properties'], {'Height': '18.000'})
+        self.assertEqual(content['nearest']['properties'], {'Thrust': '9.493'})
+
+    def test_ancestors_of_missing_path(self):
+        """Test that the deepest existing ancestor of a missing path is returned as the nearest entity."""
+        response = self._ancestors('Rocket/Stage1/Engine2/Turbopump1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['found'])
+        self.assertEqual(response.data['nearest']['id'], self.stage1.id)
+        self.assertEqual([entity['path'] for entity in response.data['ancestors']], ['/Rocket', '/Rocket/Stage1'])
+
+    def test_ancestors_not_found(self):
+        """Test that a path without even an existing root returns 404."""
+        response = self._ancestors('Rocket3/Stage1')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_ancestors_single_query(self):
+        """Test that ancestors are read with one query however deep the path is."""
+        with self.assertNumQueries(1):
+            ancestors = Entity.objects.fetch_ancestors('/Rocket/Stage1/Engine1/Turbopump1/Valve1')
+        self.assertEqual([entity['name'] for entity in ancestors], ['Rocket', 'Stage1', 'Engine1'])
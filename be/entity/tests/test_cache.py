@@ -0,0 +1,117 @@
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from entity import cache as subtree_cache
+from entity.models import Attribute, Entity
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'subtree-cache-tests',
+    }
+})
+class SubtreeCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        # Create test entities
+        self.rocket = Entity.objects.create(name='Rocket')
+        self.stage1 = Entity.objects.create(name='Stage1', parent=self.rocket)
+        self.engine1 = Entity.objects.create(name='Engine1', parent=self.stage1)
+        self.stage2 = Entity.objects.create(name='Stage2', parent=self.rocket)
+
+        # Warm the cache for every subtree
+        for entity in [self.rocket, self.stage1, self.engine1, self.stage2]:
+            self._get(entity)
+        cache.delete_many([subtree_cache.HITS_KEY, subtree_cache.MISSES_KEY])
+
+    def _get(self, entity, **params):
+        url = reverse('simple-use-api', kwargs={'path': entity.path})
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_repeated_get_is_cached(self):
+        """Test that a repeated subtree request is served without querying the tree."""
+        # Only the subtree signature and the path lookup reach the database
+        with self.assertNumQueries(2):
+            self._get(self.rocket)
+
+        stats = subtree_cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 0)
+
+    def test_query_options_are_cached_separately(self):
+        """Test that depth limited subtrees do not share cache entries with full subtrees."""
+        response = self._get(self.rocket, depth=0)
+        self.assertEqual(response.data.get('descendants'), [])
+        self.assertEqual(subtree_cache.stats()['misses'], 1)
+
+    def test_attribute_write_invalidates_ancestors(self):
+        """Test that writing an attribute invalidates the subtrees containing it and no others."""
+        Attribute.objects.create(entity=self.engine1, key='Thrust', value=Decimal('9.493'))
+
+        # Subtrees containing Engine1 are rebuilt
+        for entity in [self.rocket, self.stage1, self.engine1]:
+            self._get(entity)
+        self.assertEqual(subtree_cache.stats()['misses'], 3)
+        response = self._get(self.engine1)
+        self.assertEqual(response.data.get('properties').get('Thrust'), Decimal('9.493'))
+
+        # Sibling subtrees stay cached
+        self._get(self.stage2)
+        self.assertEqual(subtree_cache.stats()['hits'], 2)
+
+    def test_attribute_move_invalidates_old_entity(self):
+        """Test that moving an attribute to another entity invalidates the subtrees it was moved out of."""
+        attribute = Attribute.objects.create(entity=self.stage2, key='Thrust', value=Decimal('9.493'))
+        self.assertEqual(self._get(self.stage2).data.get('properties'), {'Thrust': Decimal('9.493')})
+
+        self.client.force_authenticate(user=self._create_user())
+        response = self.client.patch(
+            reverse('attribute-detail', args=[attribute.id]), {'entity': self.engine1.id}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self._get(self.stage2).data.get('properties'), {})
+        self.assertEqual(self._get(self.engine1).data.get('properties'), {'Thrust': Decimal('9.493')})
+
+    def test_entity_create_and_delete_invalidate_ancestors(self):
+        """Test that creating and deleting an entity invalidates its ancestors' subtrees."""
+        engine2 = Entity.objects.create(name='Engine2', parent=self.stage1)
+        response = self._get(self.stage1)
+        self.assertIn('Engine2', [d.get('name') for d in response.data.get('descendants')])
+
+        engine2.delete()
+        response = self._get(self.rocket)
+        stage1 = response.data.get('descendants')[0]
+        self.assertNotIn('Engine2', [d.get('name') for d in stage1.get('descendants')])
+        self.assertEqual(subtree_cache.stats()['hits'], 0)
+
+    def test_rename_invalidates_descendants(self):
+        """Test that renaming an entity invalidates the cached subtrees of its descendants."""
+        self.stage1.name = 'Booster'
+        self.stage1.save()
+
+        url = reverse('simple-use-api', kwargs={'path': 'Rocket/Stage1/Engine1'})
+        response = self.client.get(url)
+        self.assertEqual(response.data, {'message': 'Entity not found.'})
+        response = self._get(Entity.objects.get(path='/Rocket/Booster/Engine1'))
+        self.assertEqual(response.data.get('path'), '/Rocket/Booster/Engine1')
+
+    def test_cache_stats_endpoint(self):
+        """Test that hit and miss counters are exposed through the API."""
+        self._get(self.rocket)
+        self.client.force_authenticate(user=self._create_user())
+        response = self.client.get(reverse('subtree-cache'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data.get('hits'), 1)
+        self.assertEqual(response.data.get('misses'), 0)
+
+    def _create_user(self):
+        from django.contrib.auth.models import User
+        return User.objects.create_user(username="testuser", password="password")
@@ -0,0 +1,84 @@
+import csv
+import gzip
+import io
+import json
+from decimal import Decimal
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from entity.models import Attribute, Entity
+
+
+class SubtreeExportTestCase(APITestCase):
+    def setUp(self):
+        # Create test entities
+        self.rocket = Entity.objects.create(name='Rocket')
+        self.stage1 = Entity.objects.create(name='Stage1', parent=self.rocket)
+        self.engine1 = Entity.objects.create(name='Engine1', parent=self.stage1)
+        self.stage2 = Entity.objects.create(name='Stage2', parent=self.rocket)
+        Attribute.objects.create(entity=self.engine1, key='Thrust', value=Decimal('9.493'))
+        Attribute.objects.create(entity=self.engine1, key='ISP', value=Decimal('12.156'))
+        # Create an unrelated tree sharing a name prefix
+        Entity.objects.create(name='Rocket2')
+
+    def _export(self, path, **params):
+        url = reverse('subtree-export', kwargs={'path': path})
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response
+
+    def test_export_ndjson(self):
+        """Test that a subtree is exported as one NDJSON record per property or property-less entity."""
+        response = self._export('Rocket', precise='true')
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        self.assertIn('Rocket.ndjson', response['Content-Disposition'])
+
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(records, [
+            {'id': self.rocket.id, 'parent_id': None, 'path': '/Rocket', 'depth': 0, 'key': None, 'value': None},
+            {'id': self.stage1.id, 'parent_id': self.rocket.id, 'path': '/Rocket/Stage1', 'depth': 1,
+             'key': None, 'value': None},
+            {'id': self.engine1.id, 'parent_id': self.stage1.id, 'path': '/Rocket/Stage1/Engine1', 'depth': 2,
+             'key': 'Thrust', 'value': '9.493'},
+            {'id': self.engine1.id, 'parent_id': self.stage1.id, 'path': '/Rocket/Stage1/Engine1', 'depth': 2,
+             'key': 'ISP', 'value': '12.156'},
+            {'id': self.stage2.id, 'parent_id': self.rocket.id, 'path': '/Rocket/Stage2', 'depth': 1,
+             'key': None, 'value': None},
+        ])
+
+    def test_export_csv(self):
+        """Test that a subtree is exported as CSV rows below a header."""
+        response = self._export('Rocket/Stage1', format='csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+
+        content = b''.join(response.streaming_content).decode('utf-8')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row['path'] for row in rows], ['/Rocket/Stage1'] + ['/Rocket/Stage1/Engine1'] * 2)
+        self.assertEqual(rows[0]['parent_id'], str(self.rocket.id))
+        self.assertEqual(rows[0]['key'], '')
+        self.assertEqual({row['key']: row['value'] for row in rows[1:]}, {'Thrust': '9.493', 'ISP': '12.156'})
+
+    def test_export_gzip(self):
+        """Test that exports are compressed on the fly for clients accepting gzip."""
+        url = reverse('subtree-export', kwargs={'path': 'Rocket'})
+        response = self.client.get(url, {'format': 'csv'}, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        content = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        self.assertEqual(content, b''.join(self._export('Rocket', format='csv').streaming_content).decode('utf-8'))
+
+    def test_export_depth(self):
+        """Test that exports can be limited to a number of levels."""
+        response = self._export('Rocket', format='csv', depth=1)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual([row['path'] for row in rows], ['/Rocket', '/Rocket/Stage1', '/Rocket/Stage2'])
+
+    def test_export_not_found(self):
+        """Test that exporting a missing entity returns 404."""
+        url = reverse('subtree-export', kwargs={'path': 'Rocket/Stage3'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
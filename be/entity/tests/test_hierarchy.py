@@ -0,0 +1,104 @@
+import unittest
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from entity.hierarchy import get_backend
+from entity.models import Entity
+
+
+def ltree_available():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'ltree'")
+        return cursor.fetchone() is not None
+
+
+class HierarchyBackendTestMixin:
+    backend = None
+
+    def setUp(self):
+        override = override_settings(ENTITY_HIERARCHY_BACKEND=self.backend)
+        override.enable()
+        self.addCleanup(override.disable)
+        get_backend().install()
+
+        # Create a tree and a sibling tree sharing a name prefix
+        self.rocket = Entity.objects.create(name='Rocket')
+        self.stage1 = Entity.objects.create(name='Stage1', parent=self.rocket)
+        self.engine1 = Entity.objects.create(name='Engine1', parent=self.stage1)
+        self.stage2 = Entity.objects.create(name='Stage2', parent=self.rocket)
+        self.rocket2 = Entity.objects.create(name='Rocket2')
+
+    def _subtree_paths(self, root_path):
+        return [row[2] for row in Entity.objects.fetch_descendants(root_path)]
+
+    def _structure(self):
+        with connection.cursor() as cursor:
+            if self.backend == 'ltree':
+                cursor.execute("SELECT id, id_path::text FROM entity_entity ORDER BY id")
+            elif self.backend == 'closure':
+                cursor.execute("SELECT ancestor_id, descendant_id, depth FROM entity_entityclosure ORDER BY 1, 2")
+            else:
+                return []
+            return cursor.fetchall()
+
+    def test_subtree_follows_creates_and_moves(self):
+        self.assertEqual(self._subtree_paths('/Rocket'), [
+            '/Rocket', '/Rocket/Stage1', '/Rocket/Stage1/Engine1', '/Rocket/Stage2'
+        ])
+        self.assertEqual(Entity.objects.subtree_signature('/Rocket')[0], 4)
+
+        # Move a subtree into the other tree
+        self.stage1.parent = self.rocket2
+        self.stage1.save()
+        self.assertEqual(self._subtree_paths('/Rocket'), ['/Rocket', '/Rocket/Stage2'])
+        self.assertEqual(self._subtree_paths('/Rocket2'), ['/Rocket2', '/Rocket2/Stage1', '/Rocket2/Stage1/Engine1'])
+
+        # Detach an entity as a root and import below it
+        self.engine1.refresh_from_db()
+        self.engine1.parent = None
+        self.engine1.save()
+        Entity.objects.bulk_import([('/Engine1/Turbopump1/Valve1', {}), ('/Engine1/Turbopump1', {})])
+        self.assertEqual(self._subtree_paths('/Rocket2'), ['/Rocket2', '/Rocket2/Stage1'])
+        self.assertEqual(self._subtree_paths('/Engine1'), [
+            '/Engine1', '/Engine1/Turbopump1', '/Engine1/Turbopump1/Valve1'
+        ])
+        self.assertEqual(self._subtree_paths('/Engine1/Turbopump1/Valve2'), [])
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.stage1.parent = self.rocket2
+        self.stage1.save()
+        Entity.objects.create(name='Engine2', parent=self.stage1)
+        incremental = self._structure()
+
+        get_backend().rebuild()
+        self.assertEqual(self._structure(), incremental)
+
+
+class PathHierarchyTestCase(HierarchyBackendTestMixin, TestCase):
+    backend = 'path'
+
+
+class ClosureHierarchyTestCase(HierarchyBackendTestMixin, TestCase):
+    backend = 'closure'
+
+    def test_closure_rows(self):
+        rows = set(self._structure())
+        self.assertIn((self.rocket.id, self.engine1.id, 2), rows)
+        self.assertIn((self.engine1.id, self.engine1.id, 0), rows)
+        self.assertEqual(len(rows), 9)
+
+
+class LtreeHierarchyTestCase(HierarchyBackendTestMixin, TestCase):
+    backend = 'ltree'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if not ltree_available():
+            cls.tearDownClass()
+            raise unittest.SkipTest('The ltree extension is not available.')
+
+    def test_id_paths(self):
+        id_paths = dict(self._structure())
+        self.assertEqual(id_paths[self.engine1.id], f'{self.rocket.id}.{self.stage1.id}.{self.engine1.id}')
+        self.assertEqual(id_paths[self.rocket2.id], str(self.rocket2.id))
@@ -0,0 +1,96 @@
+import json
+from decimal import Decimal
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from entity.models import Attribute, Entity
+
+
+class SubtreeImportTestCase(APITestCase):
+    def setUp(self):
+        self.rocket = Entity.objects.create(name='Rocket')
+        self.url = reverse('subtree-import')
+
+        # Set up user and authentication
+        self.user = self._create_user()
+        self.client.force_authenticate(user=self.user)
+
+    def _create_user(self):
+        from django.contrib.auth.models import User
+        return User.objects.create_user(username="testuser", password="password")
+
+    def test_import_nested_tree(self):
+        """Test that a nested tree is attached under an existing parent with its properties."""
+        tree = {
+            'name': 'Stage1',
+            'properties': {'Mass': 175.000},
+            'descendants': [
+                {'name': 'Engine1', 'properties': {'Thrust': 9.493, 'ISP': '12.156'}},
+                {'name': 'Engine2', 'descendants': [{'name': 'Turbopump1'}]},
+            ]
+        }
+        # Send precise numbers, since the test client would round trip them through floats
+        payload = json.dumps(tree).replace('175.0', '175.000')
+        response = self.client.post(f'{self.url}?parent=/Rocket', payload, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data.get('entities'), 4)
+        self.assertEqual(response.data.get('attributes'), 3)
+        self.assertIn('rows_per_second', response.data)
+
+        # Verify paths, parents and trees
+        turbopump1 = Entity.objects.get(path='/Rocket/Stage1/Engine2/Turbopump1')
+        self.assertEqual(turbopump1.parent.path, '/Rocket/Stage1/Engine2')
+        self.assertEqual(turbopump1.tree_id, self.rocket.tree_id)
+        # Verify that property precision is kept
+        mass = Attribute.objects.get(entity__path='/Rocket/Stage1', key='Mass')
+        self.assertEqual(mass.scale, 3)
+        subtree = self.rocket.subtree()
+        engine1 = subtree['descendants'][0]['descendants'][0]
+        self.assertEqual(engine1['properties'], {'Thrust': Decimal('9.493'), 'ISP': Decimal('12.156')})
+
+    def test_import_ndjson_records(self):
+        """Test that NDJSON records in any order create new roots and descendants."""
+        records = [
+            {'path': '/Rocket2/Stage1', 'properties': {'Mass': 12.5}},
+            {'path': '/Rocket2'},
+            {'path': '/Rocket/Stage2'},
+        ]
+        payload = '\n'.join(json.dumps(record) for record in records) + '\n'
+        response = self.client.post(self.url, payload, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data.get('entities'), 3)
+
+        rocket2 = Entity.objects.get(path='/Rocket2')
+        self.assertIsNone(rocket2.parent)
+        self.assertEqual(rocket2.tree_id, rocket2.id)
+        stage1 = Entity.objects.get(path='/Rocket2/Stage1')
+        self.assertEqual(stage1.parent, rocket2)
+        self.assertEqual(stage1.get_attributes(), {'Mass': Decimal('12.5')})
+        self.assertEqual(Entity.objects.get(path='/Rocket/Stage2').parent, self.rocket)
+
+    def test_import_rejects_invalid_records(self):
+        """Test that conflicting, orphaned and malformed records abort the whole import."""
+        payloads = [
+            # Existing entity
+            '{"path": "/Rocket/Stage1"}\n{"path": "/Rocket"}',
+            # Missing parent
+            '{"path": "/Rocket/Stage1"}\n{"path": "/Rocket/Stage2/Engine1"}',
+            # Invalid property value
+            '{"path": "/Rocket/Stage1", "properties": {"Mass": "heavy"}}',
+            # Malformed line
+            '{"path": "/Rocket/Stage1"}\n{"path": ',
+        ]
+        for payload in payloads:
+            response = self.client.post(self.url, payload, content_type='application/x-ndjson')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Entity.objects.count(), 1)
+
+        response = self.client.post(self.url, {'name': 'Stage/1'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_requires_authentication(self):
+        """Test that anonymous clients cannot import."""
+        self.client.force_authenticate(user=None)
+        response = self.client.post(self.url, {'name': 'Rocket2'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -40,6 +40,31 @@ class EntityViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data.get('results')), Entity.objects.count())
 
+    def test_entity_list_pages(self):
+        """Test that the list endpoint pages through all entities in path order by following cursors."""
+        response = self.client.get(self.list_url, {'page_size': 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 6)
+        self.assertIsNone(response.data['previous'])
+        paths = [entity['path'] for entity in response.data['results']]
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['next'])
+        paths += [entity['path'] for entity in response.data['results']]
+        self.assertEqual(paths, list(Entity.objects.order_by('path', 'id').values_list('path', flat=True)))
+
+        # Step back to the first page
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([entity['path'] for entity in response.data['results']], paths[:4])
+
+    def test_entity_list_without_count(self):
+        """Test that the total count can be skipped."""
+        response = self.client.get(self.list_url, {'count': 'false'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 6)
+
     def test_entity_detail(self):
         """Test that the detail endpoint returns the correct entity."""
         response = self.client.get(self.detail_url)
@@ -68,6 +93,18 @@ class EntityViewSetTestCase(APITestCase):
         # Verify the child node path
         self.assertEqual(response.data.get('path'), self.stage1engine1_path)
 
+    def test_entity_subtree_depth(self):
+        """Test that the subtree action can be limited to a number of levels."""
+        response = self.client.get(self.subtree_url, {'depth': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Verify that grandchildren are omitted and marked as available
+        stages = response.data.get('descendants')
+        self.assertEqual([s.get('name') for s in stages], [self.stage1.name, self.stage2.name])
+        for stage in stages:
+            self.assertEqual(stage.get('descendants'), [])
+            self.assertTrue(stage.get('has_more'))
+
     def test_create_entity(self):
         """Test that we can create a new entity."""
         data = {
@@ -168,6 +205,16 @@ class AttributeViewSetTestCase(APITestCase):
         from django.contrib.auth.models import User
         return User.objects.create_user(username="testuser", password="password")
 
+    def test_attribute_list_pages(self):
+        """Test that the attribute list endpoint pages through attributes in id order."""
+        response = self.client.get(reverse('attribute-list'), {'page_size': 1, 'count': 'false'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [attribute['id'] for attribute in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            ids += [attribute['id'] for attribute in response.data['results']]
+        self.assertEqual(ids, sorted(Attribute.objects.values_list('id', flat=True)))
+
     def test_add_attribute_to_entity(self):
         """Test that we can add a new attribute to an entity."""
         data = {
@@ -252,3 +299,18 @@ class AttributeViewSetTestCase(APITestCase):
         self.assertIsNone(response_isp)
         s1e1_isp_count = self.stage1engine1.attributes.filter(key="ISP").count()
         self.assertEqual(s1e1_isp_count, 0)
+
+    def test_entity_subtree_not_modified(self):
+        """Test that the subtree action answers conditional requests until the subtree changes."""
+        s1_subtree_url = reverse('entity-subtree', args=[self.stage1.id])
+        response = self.client.get(s1_subtree_url)
+        etag = response.headers.get('ETag')
+        response = self.client.get(s1_subtree_url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Verify that renaming an ancestor changes the ETag of the moved subtree
+        self.rocket.name = 'Rocket2'
+        self.rocket.save()
+        response = self.client.get(s1_subtree_url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data.get('path'), '/Rocket2/Stage1')
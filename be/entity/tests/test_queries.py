@@ -0,0 +1,85 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from entity.models import Entity
+
+
+class QueryCountTestCase(APITestCase):
+    """Guards against reads whose number of queries grows with the number of entities or attributes."""
+
+    def setUp(self):
+        # Create a small and a large tree with the same shape of properties
+        self._grow('Small', fanout=1)
+        self._grow('Large', fanout=6)
+        self.client.force_authenticate(user=User.objects.create_user(username='testuser', password='password'))
+
+    def _grow(self, root_name, fanout):
+        records = [(f'/{root_name}', {'Mass': '1.5'})]
+        for stage in range(fanout):
+            records.append((f'/{root_name}/Stage{stage}', {'Mass': '2.5', 'Thrust': '9.493'}))
+            for engine in range(fanout):
+                records.append((f'/{root_name}/Stage{stage}/Engine{engine}', {'ISP': '12.156'}))
+        Entity.objects.bulk_import(records)
+
+    def _get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def _count_queries(self, func):
+        with CaptureQueriesContext(connection) as context:
+            func()
+        return len(context)
+
+    def assertConstantQueries(self, func):
+        """Asserts that `func(root_name)` issues as many queries for the large tree as for the small one."""
+        self.assertEqual(self._count_queries(lambda: func('Small')), self._count_queries(lambda: func('Large')))
+
+    def test_repr(self):
+        """Test that an entity's nested representation is read with one query."""
+        entity = Entity.objects.get(path='/Large/Stage1')
+        with self.assertNumQueries(1):
+            data = entity._repr(root=True)
+        self.assertEqual(data['parent'], 'Large')
+        self.assertEqual(len(data['descendants']), 6)
+        self.assertEqual(data['properties'], {'Mass': Decimal('2.5'), 'Thrust': Decimal('9.493')})
+        self.assertEqual(data['descendants'][0]['properties'], {'ISP': Decimal('12.156')})
+
+    def test_get_attributes_prefetched(self):
+        """Test that prefetched attributes are read without a query per entity."""
+        with self.assertNumQueries(2):
+            properties = [e.get_attributes() for e in Entity.objects.prefetch_related('attributes')]
+        self.assertEqual(len(properties), Entity.objects.count())
+
+    def test_simple_use_get(self):
+        """Test that a subtree GET issues the same queries for any tree size."""
+        self.assertConstantQueries(lambda root_name: self._get(f'/{root_name}'))
+
+    def test_entity_subtree(self):
+        """Test that the subtree action issues the same queries for any tree size."""
+        self.assertConstantQueries(lambda root_name: self._get(reverse(
+            'entity-subtree', args=[Entity.objects.get(path=f'/{root_name}').id]
+        )))
+
+    def test_export(self):
+        """Test that an export issues the same queries for any tree size."""
+        self.assertConstantQueries(lambda root_name: self._get(reverse('subtree-export', kwargs={'path': root_name})))
+
+    def test_ancestors(self):
+        """Test that ancestors are read with the same queries for any tree size."""
+        self.assertConstantQueries(lambda root_name: self._get(reverse(
+            'ancestors', kwargs={'path': f'{root_name}/Stage0/Engine0'}
+        )))
+
+    def test_entity_list(self):
+        """Test that a page of entities issues the same queries for any page size."""
+        self.assertConstantQueries(lambda root_name: self._get(
+            reverse('entity-list'), {'page_size': 2 if root_name == 'Small' else 40}
+        ))
@@ -0,0 +1,56 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from entity.models import Entity
+
+
+class SearchTestCase(APITestCase):
+    def setUp(self):
+        # Create test entities
+        self.rocket = Entity.objects.create(name='Rocket')
+        self.stage1 = Entity.objects.create(name='Stage1', parent=self.rocket)
+        self.engine1 = Entity.objects.create(name='Engine1', parent=self.stage1)
+        self.engine2 = Entity.objects.create(name='Engine2', parent=self.stage1)
+        self.stage2 = Entity.objects.create(name='Stage2', parent=self.rocket)
+        # Create an unrelated tree sharing a name prefix
+        self.rocket2 = Entity.objects.create(name='Rocket2')
+        Entity.objects.create(name='Stage1', parent=self.rocket2)
+
+    def _search(self, **params):
+        response = self.client.get(reverse('search'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_search_partial_path(self):
+        """Test that a partial path is completed among the children of its parent."""
+        results = self._search(q='Rocket/St')
+        self.assertEqual(results, [
+            {'id': self.stage1.id, 'name': 'Stage1', 'path': '/Rocket/Stage1', 'child_count': 2},
+            {'id': self.stage2.id, 'name': 'Stage2', 'path': '/Rocket/Stage2', 'child_count': 0},
+        ])
+        self.assertEqual([result['path'] for result in self._search(q='/Rocket/Stage1/')], [
+            '/Rocket/Stage1/Engine1', '/Rocket/Stage1/Engine2'
+        ])
+
+    def test_search_root_names(self):
+        """Test that a leading slash completes root names only."""
+        self.assertEqual([result['path'] for result in self._search(q='/Ro')], ['/Rocket', '/Rocket2'])
+
+    def test_search_name_prefix(self):
+        """Test that a query without a slash matches the start of names anywhere in the tree."""
+        results = self._search(q='Stage1')
+        self.assertEqual([result['path'] for result in results], ['/Rocket/Stage1', '/Rocket2/Stage1'])
+        self.assertEqual([result['path'] for result in self._search(q='Engine', limit=1)], ['/Rocket/Stage1/Engine1'])
+
+    def test_search_escapes_wildcards(self):
+        """Test that LIKE wildcards in the query are matched literally."""
+        self.assertEqual(self._search(q='%'), [])
+        self.assertEqual(self._search(q='Rocket/_tage1'), [])
+
+    def test_search_invalid(self):
+        """Test that a query is required and the limit is bounded."""
+        response = self.client.get(reverse('search'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('search'), {'q': 'Rocket', 'limit': 100})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
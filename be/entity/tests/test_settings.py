@@ -0,0 +1,46 @@
+import os
+import runpy
+from unittest.mock import patch
+from django.db import connection
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+from rocketjunior import settings
+
+
+class DatabaseSettingsTestCase(SimpleTestCase):
+    def _load_settings(self, **environ):
+        # Execute a fresh copy of the settings module rather than reloading the one Django is using
+        with patch.dict(os.environ):
+            for name in [name for name in os.environ if name.startswith('DB_')]:
+                del os.environ[name]
+            os.environ.update(environ)
+            return runpy.run_path(settings.__file__)
+
+    def test_persistent_connections(self):
+        """Test that connections are kept open and health checked as configured."""
+        database = self._load_settings(DB_CONN_MAX_AGE='30', DB_CONN_HEALTH_CHECKS='false')['DATABASES']['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 30)
+        self.assertFalse(database['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('pool', database.get('OPTIONS', {}))
+
+    def test_connection_pool(self):
+        """Test that DB_POOL configures a psycopg pool that serves queries."""
+        database = self._load_settings(DB_POOL='true', DB_POOL_MIN_SIZE='1', DB_POOL_MAX_SIZE='3')['DATABASES']
+        database = database['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['pool'], {'min_size': 1, 'max_size': 3, 'timeout': 10})
+
+        # Open the pool against the test database on a connection of its own
+        handler = ConnectionHandler({
+            'default': connection.settings_dict,
+            'pooled': {**database, 'NAME': connection.settings_dict['NAME']},
+        })
+        pooled = handler['pooled']
+        try:
+            with pooled.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                self.assertEqual(cursor.fetchone(), (1,))
+            self.assertIsNotNone(pooled.pool)
+        finally:
+            pooled.close()
+            pooled.close_pool()
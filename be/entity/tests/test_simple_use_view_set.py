@@ -1,8 +1,11 @@
 import json
+from asgiref.sync import sync_to_async
 from decimal import Decimal
+from unittest.mock import patch
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from entity.managers import EntityManager
 from entity.models import Entity, Attribute
 
 
@@ -113,6 +116,47 @@ class SimpleUseViewSetTestCase(APITestCase):
         self.assertTrue(attributes.filter(key='Thrust', value=thrust).exists())
         self.assertTrue(attributes.filter(key='ISP', value=isp).exists())
 
+    def test_update_attributes_of_entity(self):
+        Attribute.objects.create(entity=self.engine1, key='Thrust', value=Decimal('9.493'))
+        url = reverse('simple-use-api', kwargs={'path': 'Rocket/Stage1/Engine1'})
+        payload = {"Thrust": "10.5", "ISP": 12.156}
+        response = self.client.post(url, json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # Verify existing attributes are updated and new ones created
+        self.assertEqual(response.data.get('properties'), {'Thrust': Decimal('10.5'), 'ISP': Decimal('12.156')})
+        self.assertEqual(Attribute.objects.filter(entity=self.engine1).count(), 2)
+
+        # Verify invalid values are rejected without writing the others
+        payload = {"Thrust": "11", "ISP": "fast"}
+        response = self.client.post(url, json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.engine1.get_attributes().get('Thrust'), Decimal('10.5'))
+
+    def test_minimal_write_response(self):
+        Entity.objects.create(name='Turbopump1', parent=self.engine1)
+        url = reverse('simple-use-api', kwargs={'path': 'Rocket/Stage1/Engine1'})
+        payload = json.dumps({"Thrust": "9.493"})
+
+        for query, headers in [('?return=minimal', {}), ('', {'Prefer': 'handling=strict; return=minimal'})]:
+            response = self.client.post(url + query, payload, content_type='application/json', headers=headers)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.headers.get('Preference-Applied'), 'return=minimal')
+            # Verify only the written node is returned
+            self.assertEqual(response.data, {
+                'id': self.engine1.id,
+                'name': 'Engine1',
+                'path': '/Rocket/Stage1/Engine1',
+                'properties': {'Thrust': Decimal('9.493')}
+            })
+
+        # Verify new nodes are acknowledged the same way
+        url = reverse('simple-use-api', kwargs={'path': 'Rocket/Stage2'})
+        response = self.client.post(f'{url}?return=minimal', {}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data.get('path'), '/Rocket/Stage2')
+        self.assertNotIn('descendants', response.data)
+
     def test_create_entity_under_nonexistent_parent(self):
         # Test creating an entity under a non-existent parent
         url = reverse('simple-use-api', kwargs={'path': 'NonExistentParent/ChildEntity'})
@@ -146,7 +190,7 @@ class SimpleUseViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         # Verify the attributes' values are returned as floats
-        properties = response.data.get('properties')
+        properties = json.loads(response.content).get('properties')
         self.assertEqual(properties.get('Thrust'), float(thrust))
         self.assertEqual(properties.get('ISP'), float(isp))
 
@@ -156,6 +200,133 @@ class SimpleUseViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         # Verify the attributes' values are returned as strings
-        properties = response.data.get('properties')
+        properties = json.loads(response.content).get('properties')
         self.assertEqual(properties.get('Thrust'), str(thrust))
         self.assertEqual(properties.get('ISP'), str(isp))
+
+    def test_stream_entity_subtree(self):
+        # Create attributes and a sibling whose name sorts between Engine1 and its descendants
+        Attribute.objects.create(entity=self.engine1, key='Thrust', value=Decimal('9.493'))
+        Attribute.objects.create(entity=self.engine1, key='ISP', value=Decimal('300.0'))
+        Entity.objects.create(name='Turbopump1', parent=self.engine1)
+        Entity.objects.create(name='Engine1 Spare', parent=self.stage1)
+        url = reverse('simple-use-api', kwargs={'path': 'Rocket'})
+
+        for precise in ['false', 'true']:
+            # Get buffered and streamed subtrees
+            response = self.client.get(url, query_params={'precise': precise})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            streamed_response = self.client.get(url, query_params={'precise': precise, 'stream': 'true'})
+            self.assertEqual(streamed_response.status_code, status.HTTP_200_OK)
+            self.assertTrue(streamed_response.streaming)
+
+            # Verify that the streamed body matches the rendered subtree
+            streamed_content = b''.join(streamed_response.streaming_content)
+            self.assertEqual(streamed_content, response.content)
+
+    def test_get_depth_limited_subtree(self):
+        Entity.objects.create(name='Stage2', parent=self.rocket)
+        url = reverse('simple-use-api', kwargs={'path': 'Rocket'})
+        response = self.client.get(url, query_params={'depth': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Verify that only the first level of descendants is included
+        self.assertFalse(response.data.get('has_more'))
+        descendants = {d.get('name'): d for d in response.data.get('descendants')}
+        self.assertEqual(set(descendants.keys()), {'Stage1', 'Stage2'})
+        # Verify that truncated nodes are marked
+        self.assertEqual(descendants['Stage1'].get('descendants'), [])
+        self.assertTrue(descendants['Stage1'].get('has_more'))
+        self.assertFalse(descendants['Stage2'].get('has_more'))
+
+    def test_get_node_limited_subtree(self):
+        Entity.objects.create(name='Stage2', parent=self.rocket)
+        url = reverse('simple-use-api', kwargs={'path': 'Rocket'})
+        response = self.client.get(url, query_params={'max_nodes': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Verify that nodes are filled level by level
+        self.assertTrue(response.data.get('has_more'))
+        descendants = response.data.get('descendants')
+        self.assertEqual([d.get('name') for d in descendants], ['Stage1'])
+        self.assertTrue(descendants[0].get('has_more'))
+
+    def test_stream_limited_subtree(self):
+        Entity.objects.create(name='Stage2', parent=self.rocket)
+        url = reverse('simple-use-api', kwargs={'path': 'Rocket'})
+        for params in [{'depth': 1}, {'max_nodes': 3}]:
+            response = self.client.get(url, query_params=params)
+            streamed_response = self.client.get(url, query_params={**params, 'stream': 'true'})
+            streamed_content = b''.join(streamed_response.streaming_content)
+            self.assertEqual(streamed_content, response.content)
+
+    def test_get_subtree_invalid_limits(self):
+        url = reverse('simple-use-api', kwargs={'path': 'Rocket'})
+        response = self.client.get(url, query_params={'depth': -1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, query_params={'max_nodes': 'all'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_subtree_not_modified(self):
+        url = reverse('simple-use-api', kwargs={'path': 'Rocket/Stage1'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response.headers.get('ETag')
+        self.assertIsNotNone(etag)
+
+        # Verify that an unchanged subtree is not rebuilt
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        # Verify that streamed and buffered subtrees, whose bytes may differ, do not share validators
+        response = self.client.get(url, query_params={'stream': 'true'}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stream_etag = response.headers.get('ETag')
+        self.assertNotEqual(stream_etag, etag)
+        b''.join(response.streaming_content)
+        response = self.client.get(url, query_params={'stream': 'true'}, headers={'If-None-Match': stream_etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Verify that differently rendered subtrees do not
+        response = self.client.get(url, query_params={'precise': 'true'}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(url, query_params={'depth': 0}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Verify that writes anywhere in the subtree change the ETag
+        attribute = Attribute.objects.create(entity=self.engine1, key='Thrust', value=Decimal('9.493'))
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response.headers.get('ETag')
+        attribute.delete()
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data.get('descendants')[0].get('properties'), {})
+
+    def test_get_subtree_without_signature(self):
+        # Simulate a hierarchy backend whose structure has not been rebuilt, so the subtree matches no rows
+        url = reverse('simple-use-api', kwargs={'path': 'Rocket/Stage1'})
+        with patch.object(EntityManager, 'subtree_signature', return_value=(0, None, 0, None)):
+            response = self.client.head(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIsNone(response.headers.get('ETag'))
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIsNone(response.headers.get('ETag'))
+
+    async def test_get_entity_subtree_over_asgi(self):
+        await Attribute.objects.acreate(entity=self.engine1, key='Thrust', value=Decimal('9.493'))
+        url = reverse('simple-use-api', kwargs={'path': 'Rocket'})
+
+        # Get the subtree over WSGI and over ASGI, as Uvicorn serves it
+        wsgi_response = await sync_to_async(self.client.get)(url)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, wsgi_response.content)
+        self.assertEqual(response.headers.get('ETag'), wsgi_response.headers.get('ETag'))
+
+        # Verify that streamed subtrees are read without blocking the event loop and match
+        response = await self.async_client.get(url, {'stream': 'true'})
+        self.assertTrue(response.is_async)
+        streamed_content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(json.loads(streamed_content), json.loads(wsgi_response.content))
@@ -4,6 +4,8 @@ from django.urls import reverse
 from pathlib import Path
 from rest_framework.test import APITestCase
 
+from entity.models import Entity
+
 
 class LargeDatasetTest(APITestCase):
     @classmethod
@@ -16,6 +18,8 @@ class LargeDatasetTest(APITestCase):
         with connection.cursor() as cursor:
             with open(SQL_FILE, 'r') as sql_file:
                 cursor.execute(sql_file.read())
+        # Fill in hierarchy columns the dump may predate
+        Entity.objects.backfill_hierarchy()
 
     def test_tree_performance(self):
         """Tests subtree performance on tree with over 40,000 nodes"""
@@ -33,3 +37,16 @@ class LargeDatasetTest(APITestCase):
         self.assertEqual(tree["name"], "Node.1.0")
         self.assertTrue(len(tree["descendants"]) > 0)
         self.assertLess(end_time - start_time, 1, "Performance test exceeded 1 second")
+
+    def test_tree_query_uses_path_like_index(self):
+        """Tests that a small subtree of the 40,000 node fixture is selected through the `_like` index on path"""
+        # The parent of the deepest entity roots one of the smallest subtrees with descendants
+        root_path = Entity.objects.exclude(parent=None).order_by('-depth').first().parent.path
+        query, params = Entity.objects.descendants_query(root_path)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE entity_entity')
+            cursor.execute(f'EXPLAIN {query}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+        self.assertNotIn('Seq Scan on entity_entity', plan)
+        self.assertRegex(plan, r'(Bitmap )?Index Scan on entity_entity_path_\w+_like')
@@ -1,6 +1,16 @@
-from django.test import TestCase
+import copy
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import patch
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
 
+from entity import renderers
 from entity.models import Attribute, Entity
+from entity.renderers import SubtreeJSONRenderer
 
 
 class EntityUnitTestCase(TestCase):
@@ -51,6 +61,204 @@ class EntityUnitTestCase(TestCase):
 
         self.assertIsNone(child.parent)
 
+    def test_rename_rewrites_subtree_only(self):
+        rocket = Entity.objects.create(name='Rocket')
+        stage1 = Entity.objects.create(name='Stage1', parent=rocket)
+        engine1 = Entity.objects.create(name='Engine1', parent=stage1)
+        rocket2 = Entity.objects.create(name='Rocket2')
+        rocket2_stage1 = Entity.objects.create(name='Stage1', parent=rocket2)
+
+        rocket.name = 'Ship'
+        rocket.save()
+
+        stage1.refresh_from_db()
+        engine1.refresh_from_db()
+        rocket2.refresh_from_db()
+        rocket2_stage1.refresh_from_db()
+        self.assertEqual(stage1.path, '/Ship/Stage1')
+        self.assertEqual(engine1.path, '/Ship/Stage1/Engine1')
+        # Siblings sharing a name prefix are untouched
+        self.assertEqual(rocket2.path, '/Rocket2')
+        self.assertEqual(rocket2_stage1.path, '/Rocket2/Stage1')
+
+    def test_rename_rewrites_leading_prefix_only(self):
+        rocket = Entity.objects.create(name='Rocket')
+        stage1 = Entity.objects.create(name='Stage1', parent=rocket)
+        # Repeats the root path further down the tree
+        nested = Entity.objects.create(name='Rocket', parent=stage1)
+
+        rewritten = Entity.objects.update_child_paths_raw('/Rocket', '/Ship')
+
+        self.assertEqual(rewritten, 3)
+        nested.refresh_from_db()
+        self.assertEqual(nested.path, '/Ship/Stage1/Rocket')
+
+    def test_rename_escapes_like_wildcards(self):
+        percent = Entity.objects.create(name='100%')
+        child = Entity.objects.create(name='Child', parent=percent)
+        lookalike = Entity.objects.create(name='100% Pure')
+
+        rewritten = Entity.objects.update_child_paths_raw('/100%', '/Full')
+
+        self.assertEqual(rewritten, 2)
+        child.refresh_from_db()
+        lookalike.refresh_from_db()
+        self.assertEqual(child.path, '/Full/Child')
+        self.assertEqual(lookalike.path, '/100% Pure')
+
+    def test_fetch_descendants_matches_path_boundary(self):
+        rocket = Entity.objects.create(name='Rocket')
+        Entity.objects.create(name='Stage1', parent=rocket)
+        rocket2 = Entity.objects.create(name='Rocket2')
+        Entity.objects.create(name='Stage1', parent=rocket2)
+
+        paths = [row[2] for row in Entity.objects.fetch_descendants('/Rocket')]
+
+        self.assertEqual(paths, ['/Rocket', '/Rocket/Stage1'])
+
+    def test_fetch_descendants_orders_siblings_by_collation(self):
+        rocket = Entity.objects.create(name='Rocket')
+        for name in ['stage b', 'Stage-C', 'stage', 'Stage A', 'stageD']:
+            Entity.objects.create(name='Engine1', parent=Entity.objects.create(name=name, parent=rocket))
+
+        paths = [row[2] for row in Entity.objects.fetch_descendants('/Rocket')]
+
+        # Siblings keep the database collation's order, each followed by its own descendants
+        names = Entity.objects.filter(parent=rocket).order_by('name').values_list('name', flat=True)
+        expected = ['/Rocket']
+        for name in names:
+            expected.extend([f'/Rocket/{name}', f'/Rocket/{name}/Engine1'])
+        self.assertEqual(paths, expected)
+
+    def test_assemble_tree(self):
+        # One row per attribute, listing parents first; Rocket has a second child that was left out by a limit
+        rows = [
+            (1, 'Rocket', '/Rocket', None, 'Height', Decimal('18.000'), 2),
+            (1, 'Rocket', '/Rocket', None, 'Mass', Decimal('1.5'), 2),
+            (2, 'Stage1', '/Rocket/Stage1', 1, None, None, 1),
+            (3, 'Engine1', '/Rocket/Stage1/Engine1', 2, 'Thrust', Decimal('9.493'), 0),
+        ]
+
+        tree = Entity.objects.assemble_tree(rows, '/Rocket')
+
+        self.assertEqual(tree['properties'], {'Height': Decimal('18.000'), 'Mass': Decimal('1.5')})
+        self.assertTrue(tree['has_more'])
+        stage1 = tree['descendants'][0]
+        self.assertEqual((stage1['name'], stage1['properties'], stage1['has_more']), ('Stage1', {}, False))
+        engine1 = stage1['descendants'][0]
+        self.assertEqual((engine1['name'], engine1['properties']), ('Engine1', {'Thrust': Decimal('9.493')}))
+        self.assertEqual((engine1['descendants'], engine1['has_more']), ([], False))
+        # Unlimited rows carry no child counts, so entities are not marked
+        tree = Entity.objects.assemble_tree([row[:-1] + (None,) for row in rows], '/Rocket')
+        self.assertNotIn('has_more', tree)
+        self.assertNotIn('has_more', tree['descendants'][0])
+
+    def test_fetch_descendants_in_batches(self):
+        records = [('/Rocket', {'Height': '18.000'})]
+        for stage in range(3):
+            records.append((f'/Rocket/Stage{stage}', {'Mass': '2.5', 'Thrust': '9.493'}))
+            records.extend((f'/Rocket/Stage{stage}/Engine{engine}', {'ISP': '12.156'}) for engine in range(3))
+        Entity.objects.bulk_import(records)
+
+        for options in [{}, {'depth': 2}, {'max_nodes': 6}]:
+            with override_settings(ENTITY_FETCH_BATCH_SIZE=10000):
+                rows = list(Entity.objects.fetch_descendants('/Rocket', **options))
+                tree = Entity.objects.build_tree('/Rocket', **options)
+            # Batches that split entities' attribute rows give the same rows and tree as a single fetch
+            with override_settings(ENTITY_FETCH_BATCH_SIZE=3):
+                self.assertGreater(len(rows), 3)
+                self.assertEqual(list(Entity.objects.fetch_descendants('/Rocket', **options)), rows)
+                self.assertEqual(Entity.objects.build_tree('/Rocket', **options), tree)
+
+    def test_entity_create_queries(self):
+        # Root creates allocate their id, check the path and insert
+        with self.assertNumQueries(3):
+            rocket = Entity.objects.create(name='Rocket')
+        # Child creates check the path and insert
+        with self.assertNumQueries(2):
+            stage1 = Entity.objects.create(name='Stage1', parent=rocket)
+
+        rocket.refresh_from_db()
+        stage1.refresh_from_db()
+        self.assertEqual(rocket.tree_id, rocket.id)
+        self.assertEqual(stage1.tree_id, rocket.id)
+
+    def test_move_updates_tree_ids(self):
+        rocket = Entity.objects.create(name='Rocket')
+        stage1 = Entity.objects.create(name='Stage1', parent=rocket)
+        engine1 = Entity.objects.create(name='Engine1', parent=stage1)
+        rocket2 = Entity.objects.create(name='Rocket2')
+
+        # Move a subtree into another tree
+        stage1.parent = rocket2
+        stage1.save()
+        engine1.refresh_from_db()
+        self.assertEqual(stage1.tree_id, rocket2.id)
+        self.assertEqual(engine1.tree_id, rocket2.id)
+
+        # Detach it as a tree of its own
+        stage1.parent = None
+        stage1.save()
+        engine1.refresh_from_db()
+        self.assertEqual(stage1.tree_id, stage1.id)
+        self.assertEqual(engine1.tree_id, stage1.id)
+
+    def test_update_child_trees_matches_path_boundary(self):
+        rocket = Entity.objects.create(name='Rocket')
+        stage1 = Entity.objects.create(name='Stage1', parent=rocket)
+        rocket2 = Entity.objects.create(name='Rocket2')
+
+        updated = Entity.objects.update_child_trees('/Rocket', rocket2.id)
+
+        self.assertEqual(updated, 1)
+        stage1.refresh_from_db()
+        rocket2.refresh_from_db()
+        self.assertEqual(stage1.tree_id, rocket2.id)
+        # Sibling trees sharing a name prefix are untouched
+        self.assertEqual(rocket2.tree_id, rocket2.id)
+
+    def test_move_updates_hierarchy_columns(self):
+        rocket = Entity.objects.create(name='Rocket')
+        stage1 = Entity.objects.create(name='Stage1', parent=rocket)
+        engine1 = Entity.objects.create(name='Engine1', parent=stage1)
+        turbopump1 = Entity.objects.create(name='Turbopump1', parent=engine1)
+        self.assertEqual((rocket.parent_path, rocket.depth), (None, 0))
+        self.assertEqual((engine1.parent_path, engine1.depth), ('/Rocket/Stage1', 2))
+
+        # Move a subtree up a level and then into a new tree
+        engine1.parent = rocket
+        engine1.save()
+        turbopump1.refresh_from_db()
+        self.assertEqual((engine1.parent_path, engine1.depth), ('/Rocket', 1))
+        self.assertEqual((turbopump1.parent_path, turbopump1.depth), ('/Rocket/Engine1', 2))
+        engine1.parent = None
+        engine1.save()
+        turbopump1.refresh_from_db()
+        self.assertEqual((engine1.parent_path, engine1.depth), (None, 0))
+        self.assertEqual((turbopump1.parent_path, turbopump1.depth), ('/Engine1', 1))
+
+    def test_backfill_hierarchy(self):
+        rocket = Entity.objects.create(name='Rocket')
+        stage1 = Entity.objects.create(name='Stage1', parent=rocket)
+        Entity.objects.update(parent_path=None, depth=None)
+
+        self.assertEqual(Entity.objects.backfill_hierarchy(), 2)
+
+        stage1.refresh_from_db()
+        self.assertEqual((stage1.parent_path, stage1.depth), ('/Rocket', 1))
+        self.assertEqual(Entity.objects.get(pk=rocket.pk).parent_path, None)
+
+    def test_shallow_subtree_query_uses_parent_path(self):
+        rocket = Entity.objects.create(name='Rocket')
+        stage1 = Entity.objects.create(name='Stage1', parent=rocket)
+        Entity.objects.create(name='Engine1', parent=stage1)
+        Entity.objects.create(name='Stage1', parent=Entity.objects.create(name='Rocket2'))
+
+        for depth, paths in [(0, ['/Rocket']), (1, ['/Rocket', '/Rocket/Stage1'])]:
+            query, params = Entity.objects.descendants_query('/Rocket', depth=depth)
+            self.assertNotIn('LIKE', query)
+            self.assertEqual([row[2] for row in Entity.objects.fetch_descendants('/Rocket', depth=depth)], paths)
+
 
 class AttributeUnitTestCase(TestCase):
     def test_attribute_creation(self):
@@ -98,3 +306,105 @@ class AttributeUnitTestCase(TestCase):
             Attribute.objects.filter(id=attribute_id).count(),
             0
         )
+
+    def test_attribute_save_queries(self):
+        entity = Entity.objects.create(name='Test Entity')
+
+        # Creating and updating an attribute each take a single statement
+        with self.assertNumQueries(1):
+            attribute = Attribute.objects.create(entity=entity, key='Weight', value=Decimal('12.0'))
+        attribute.value = Decimal('13.5')
+        with self.assertNumQueries(1):
+            attribute.save()
+
+    def test_attribute_scale(self):
+        entity = Entity.objects.create(name='Test Entity')
+        Attribute.objects.create(entity=entity, key='Thrust', value=Decimal('9.4930'))
+        Attribute.objects.create(entity=entity, key='Mass', value=Decimal('1E+2'))
+        Attribute.objects.create(entity=entity, key='Offset', value=Decimal('0.00'))
+
+        # Values keep the decimal places they were written with, truncated by the database when read as a tree
+        scales = dict(Attribute.objects.filter(entity=entity).values_list('key', 'scale'))
+        self.assertEqual(scales, {'Thrust': 4, 'Mass': 0, 'Offset': 2})
+        properties = Entity.objects.build_tree(entity.path)['properties']
+        self.assertEqual({key: str(value) for key, value in properties.items()}, {
+            'Thrust': '9.4930', 'Mass': '100', 'Offset': '0.00'
+        })
+        self.assertEqual(entity.get_attributes(), properties)
+
+    def test_attribute_bulk_upsert(self):
+        entity = Entity.objects.create(name='Test Entity')
+        Attribute.objects.create(entity=entity, key='Weight', value=Decimal('12.0'))
+        values = {f'Key{i}': f'{i}.50' for i in range(200)}
+        values['Weight'] = 13.25
+
+        # All keys are written in one statement, wrapped in a savepoint
+        with self.assertNumQueries(3):
+            count = Attribute.objects.bulk_upsert(entity, values)
+
+        self.assertEqual(count, 201)
+        self.assertEqual(entity.get_attributes()['Weight'], Decimal('13.25'))
+        self.assertEqual(entity.get_attributes()['Key199'], Decimal('199.50'))
+        self.assertEqual(Attribute.objects.filter(entity=entity).count(), 201)
+
+    def test_attribute_bulk_upsert_rejects_invalid_values(self):
+        entity = Entity.objects.create(name='Test Entity')
+
+        with self.assertRaises(ValidationError):
+            Attribute.objects.bulk_upsert(entity, {'Weight': '12.0', 'Mass': 'heavy'})
+        self.assertFalse(Attribute.objects.filter(entity=entity).exists())
+
+
+class SubtreeJSONRendererUnitTestCase(TestCase):
+    def setUp(self):
+        self.data = {
+            'name': 'Engine1 \u2028',
+            'properties': {'Thrust': Decimal('9.493'), 'ISP': Decimal('300')},
+            'descendants': [{'name': 'Turbopump1', 'properties': {'Mass': Decimal('0.125')}, 'descendants': []}],
+        }
+
+    def _render(self, params=None, accepted_media_type='application/json'):
+        context = {'request': APIRequestFactory().get('/', params)}
+        data = copy.deepcopy(self.data)
+        content = SubtreeJSONRenderer().render(data, accepted_media_type, context)
+        # Values are converted while encoding, so the data is left as it was
+        self.assertEqual(data, self.data)
+        self.assertNotIn('\u2028'.encode('utf-8'), content)
+        return json.loads(content)
+
+    def _assert_renders_properties(self):
+        content = self._render()
+        self.assertEqual(content['properties'], {'Thrust': 9.493, 'ISP': 300})
+        self.assertEqual(content['descendants'][0]['properties'], {'Mass': 0.125})
+        content = self._render({'precise': 'true'})
+        self.assertEqual(content['name'], 'Engine1 \u2028')
+        self.assertEqual(content['properties'], {'Thrust': '9.493', 'ISP': '300'})
+        self.assertEqual(content['descendants'][0]['properties'], {'Mass': '0.125'})
+
+    def test_render(self):
+        self._assert_renders_properties()
+
+    def test_render_with_orjson(self):
+        if renderers.orjson is None:
+            self.skipTest('orjson is not installed.')
+        with override_settings(ENTITY_JSON_ENCODER='orjson'):
+            self._assert_renders_properties()
+
+    def test_render_indented(self):
+        content = self._render({'precise': 'true'}, 'application/json; indent=2')
+        self.assertEqual(content['properties'], {'Thrust': '9.493', 'ISP': '300'})
+
+    def test_render_other_types_like_drf(self):
+        self.data['created_at'] = datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc)
+        expected = json.loads(JSONRenderer().render(self.data))
+        encoders = ['json', 'orjson'] if renderers.orjson is not None else ['json']
+        for encoder in encoders:
+            with self.subTest(encoder=encoder), override_settings(ENTITY_JSON_ENCODER=encoder):
+                self.assertEqual(self._render(), expected)
+
+    def test_render_unknown_encoder(self):
+        with override_settings(ENTITY_JSON_ENCODER='ujson'), self.assertRaises(ImproperlyConfigured):
+            self._render()
+        with override_settings(ENTITY_JSON_ENCODER='orjson'), patch('entity.renderers.orjson', None):
+            with self.assertRaises(ImproperlyConfigured):
+                self._render()
@@ -1,4 +1,4 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
 from rest_framework import routers
 
 from entity import views
@@ -9,5 +9,10 @@ router.register(r'entity', views.EntityViewSet)
 router.register(r'attribute', views.AttributeViewSet)
 
 urlpatterns = [
-    path('', include(router.urls))
+    path('', include(router.urls)),
+    path('import/', views.SubtreeImportView.as_view(), name='subtree-import'),
+    re_path(r'^ancestors/(?P<path>.+)$', views.AncestorsView.as_view(), name='ancestors'),
+    re_path(r'^export/(?P<path>.+)$', views.SubtreeExportView.as_view(), name='subtree-export'),
+    path('search/', views.SearchView.as_view(), name='search'),
+    path('subtree-cache/', views.SubtreeCacheView.as_view(), name='subtree-cache'),
 ]
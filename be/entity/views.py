@@ -1,19 +1,38 @@
+import hashlib
 import re
+import time
 from decimal import Decimal
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiExample
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.utils.http import content_disposition_header
+from django.views.decorators.gzip import gzip_page
+from drf_spectacular.utils import (
+    extend_schema, extend_schema_view, OpenApiParameter, OpenApiExample, OpenApiResponse, PolymorphicProxySerializer
+)
 from drf_spectacular.types import OpenApiTypes
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import NotFound, ValidationError as APIValidationError
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from entity import cache as subtree_cache
 from entity.models import Attribute, Entity
+from entity.pagination import AttributeCursorPagination, EntityCursorPagination
+from entity.parsers import DecimalJSONParser, NDJSONParser
+from entity.renderers import CSVRenderer, NDJSONRenderer, SubtreeJSONRenderer
 from entity.serializers import (
-    AttributeSerializer, EntitySerializer, GenericEASerializer, GenericEAInputSerializer, GenericEASubtreeSerializer
+    AttributeSerializer, EntitySerializer, GenericEAAncestorsSerializer, GenericEASerializer, GenericEAInputSerializer,
+    GenericEANodeSerializer, GenericEASubtreeSerializer, SearchQuerySerializer, SearchResultSerializer,
+    SubtreeQuerySerializer
 )
+from entity.streaming import iterate_in_thread, stream_subtree, subtree_records
 
 
 @extend_schema_view(
@@ -29,6 +48,7 @@ class EntityViewSet(viewsets.ModelViewSet):
     queryset = Entity.objects.all()
     serializer_class = EntitySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = EntityCursorPagination
 
     def create(self, request, *args, **kwargs):
         name = request.data.get('name')
@@ -53,10 +73,25 @@ class EntityViewSet(viewsets.ModelViewSet):
 
         return super().create(request, *args, **kwargs)
 
-    @action(detail=True, methods=['GET'])
+    @action(detail=True, methods=['GET'], renderer_classes=[SubtreeJSONRenderer, BrowsableAPIRenderer])
     def subtree(self, request, pk=None):
+        options = SubtreeQuerySerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
         root_entity = get_object_or_404(Entity, pk=pk)
-        return Response(root_entity.subtree())
+
+        # Skip building the subtree when the client's copy is current
+        signature = Entity.objects.subtree_signature(root_entity.path)
+        etag = subtree_etag(
+            root_entity.path, signature, options.validated_data, request.accepted_renderer.format,
+            request.query_params.get('precise', None) == 'true'
+        )
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        response = Response(root_entity.subtree(**options.validated_data))
+        response['ETag'] = etag
+        return response
 
     def _generate_path_root(self, name):
         return f'/{name}'
@@ -74,35 +109,247 @@ class AttributeViewSet(viewsets.ModelViewSet):
     queryset = Attribute.objects.all()
     serializer_class = AttributeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = AttributeCursorPagination
+
+
+@extend_schema_view(
+    get=extend_schema(exclude=settings.HIDE_API_EXTENSIONS, responses={200: OpenApiTypes.OBJECT}),
+)
+class SubtreeCacheView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response(subtree_cache.stats())
+
+
+@extend_schema_view(
+    post=extend_schema(
+        summary='Import Nodes in Bulk',
+        description='Create many nodes and their properties in one transaction. Send either a JSON node tree '
+                    '(or a list of trees) shaped like a subtree response, or NDJSON with one '
+                    '{"path": ..., "properties": {...}} record per line using the application/x-ndjson '
+                    'content type. Existing nodes are never overwritten.',
+        parameters=[
+            OpenApiParameter(
+                'parent',
+                OpenApiTypes.STR,
+                OpenApiParameter.QUERY,
+                description='Path of an existing node to attach JSON trees to. Trees become root nodes if omitted.'
+            )
+        ],
+        request={'application/json': OpenApiTypes.OBJECT, 'application/x-ndjson': OpenApiTypes.STR},
+        responses={201: OpenApiTypes.OBJECT},
+    ),
+)
+class SubtreeImportView(APIView):
+    parser_classes = [DecimalJSONParser, NDJSONParser]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        if request.content_type.startswith(NDJSONParser.media_type):
+            records = self._parse_records(request.data)
+        else:
+            parent_path = '/' + request.query_params.get('parent', '').strip('/')
+            trees = request.data if isinstance(request.data, list) else [request.data]
+            records = self._flatten_trees(trees, parent_path.rstrip('/'))
+
+        start_time = time.perf_counter()
+        entity_count, attribute_count = Entity.objects.bulk_import(records)
+        seconds = time.perf_counter() - start_time
+
+        return Response({
+            'entities': entity_count,
+            'attributes': attribute_count,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round((entity_count + attribute_count) / seconds) if seconds else None,
+        }, status=status.HTTP_201_CREATED)
+
+    def _parse_records(self, data):
+        records = []
+        for number, record in enumerate(data, start=1):
+            if not isinstance(record, dict) or not isinstance(record.get('path'), str):
+                raise APIValidationError({'path': f'Record {number} must be an object with a string path.'})
+            path = '/' + record['path'].strip('/')
+            records.append((path, self._validate_properties(record.get('properties', {}), path)))
+        return records
+
+    def _flatten_trees(self, trees, parent_path):
+        """Flattens nested nodes into path records, iteratively since trees can be arbitrarily deep."""
+        records = []
+        stack = [(node, parent_path) for node in reversed(trees)]
+        while stack:
+            node, parent_path = stack.pop()
+            name = node.get('name') if isinstance(node, dict) else None
+            if not isinstance(name, str) or not name or '/' in name:
+                raise APIValidationError({'name': f'Nodes under {parent_path or "/"} need a name without \'/\'.'})
+            path = f'{parent_path}/{name}'
+            records.append((path, self._validate_properties(node.get('properties', {}), path)))
+            descendants = node.get('descendants', [])
+            if not isinstance(descendants, list):
+                raise APIValidationError({'descendants': f'Descendants of {path} must be a list.'})
+            stack.extend((descendant, path) for descendant in reversed(descendants))
+        return records
 
+    def _validate_properties(self, properties, path):
+        if not isinstance(properties, dict):
+            raise APIValidationError({'properties': f'Properties of {path} must be an object.'})
+        for key in properties:
+            if not key or len(key) > 256:
+                raise APIValidationError({'properties': f'Property keys of {path} must be 1 to 256 characters.'})
+        return properties
 
-class CustomJSONRenderer(JSONRenderer):
-    def render(self, data, accepted_media_type=None, renderer_context=None):
-        if isinstance(data, dict):
-            precise = None
-            request = renderer_context.get('request', None)
-            if request:
-                precise = request.query_params.get('precise', None)
-            self._convert_decimals(data, precise)
-        return super().render(data, accepted_media_type, renderer_context)
-
-    def _convert_decimals(self, data, precise=None):
-        data_keys = data.keys()
-        if 'properties' in data_keys and len(data.get('properties').keys()) > 0:
-            for key, value in data.get('properties').items():
-                # Handle precision of output
-                if precise == 'true':
-                    data['properties'][key] = str(value)
-                else:
-                    data['properties'][key] = value
-        if 'descendants' in data_keys:
-            # print('value: ', value)
-            for d in data.get('descendants'):
-                self._convert_decimals(d, precise)
+
+@extend_schema_view(
+    get=extend_schema(
+        summary='Export a Node\'s Subtree',
+        description='Stream a subtree as flat rows of id, parent_id, path, depth, key and value, with one row per '
+                    'property. Choose NDJSON or CSV with the format parameter or the Accept header. Responses are '
+                    'gzip compressed when the client accepts it.',
+        parameters=[
+            OpenApiParameter(
+                'path',
+                OpenApiTypes.STR,
+                OpenApiParameter.PATH,
+                description='Path to a node from the root node.'
+            ),
+            OpenApiParameter(
+                'format',
+                OpenApiTypes.STR,
+                OpenApiParameter.QUERY,
+                enum=['ndjson', 'csv'],
+                description='Export format. Defaults to NDJSON.'
+            ),
+            OpenApiParameter(
+                'precise',
+                OpenApiTypes.BOOL,
+                OpenApiParameter.QUERY,
+                description='Write NDJSON values as precise decimal strings.'
+            ),
+            OpenApiParameter(
+                'depth',
+                OpenApiTypes.INT,
+                OpenApiParameter.QUERY,
+                description='Number of levels below the node to include.'
+            )
+        ],
+        responses={(200, 'application/x-ndjson'): OpenApiTypes.STR, (200, 'text/csv'): OpenApiTypes.STR},
+    ),
+)
+@method_decorator(gzip_page, name='dispatch')
+class SubtreeExportView(APIView):
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    export_fields = ['id', 'parent_id', 'path', 'depth', 'key', 'value']
+
+    def get(self, request, path):
+        full_path = '/' + path.strip('/')
+        options = SubtreeQuerySerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+        name = Entity.objects.filter(path=full_path).values_list('name', flat=True).first()
+        if name is None:
+            raise NotFound('Entity not found.')
+
+        # Rows are read from a server-side cursor and written as they arrive
+        precise = request.query_params.get('precise', None) == 'true'
+        rows = Entity.objects.fetch_descendants(full_path, **options.validated_data)
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(subtree_records(rows, full_path, precise), self.export_fields),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+            status=status.HTTP_200_OK
+        )
+        response['Content-Disposition'] = content_disposition_header(True, f'{name}.{renderer.format}')
+        return response
+
+
+@extend_schema_view(
+    get=extend_schema(
+        summary='Search Node Paths',
+        description='Find nodes for autocompletion without building any subtrees. A query containing "/" completes '
+                    'the last name of a path among the children of its parent, and any other query matches the '
+                    'start of node names anywhere in the tree. Matches are ordered by name.',
+        parameters=[SearchQuerySerializer],
+        responses={200: SearchResultSerializer(many=True)},
+    ),
+)
+class SearchView(APIView):
+    def get(self, request):
+        options = SearchQuerySerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+        results = Entity.objects.search(options.validated_data['q'], options.validated_data['limit'])
+        return Response(results, status=status.HTTP_200_OK)
+
+
+def prefers_minimal(request):
+    """Returns whether the client asked for a minimal write response with `?return=minimal` or RFC 7240's Prefer."""
+    if request.query_params.get('return', None) == 'minimal':
+        return True
+    preferences = request.headers.get('Prefer', '').replace(';', ',').split(',')
+    return 'return=minimal' in [preference.strip().lower() for preference in preferences]
+
+
+def subtree_etag(path, signature, options, renderer_format, precise, stream=False):
+    """
+    Returns a strong ETag for a subtree response.
+
+    Args:
+        path (str): The path of the subtree's root entity.
+        signature (tuple): The subtree's `EntityManager.subtree_signature`.
+        options (dict): The validated subtree query options.
+        renderer_format (str): The format of the renderer writing the response body.
+        precise (bool): Whether property values are written as precise strings.
+        stream (bool): Whether the body is written by the streaming encoder, whose bytes may differ from the
+            renderer's.
+    """
+    key = repr((path, signature, sorted(options.items()), renderer_format, precise, stream))
+    return f'"{hashlib.sha1(key.encode("utf-8")).hexdigest()}"'
+
+
+@extend_schema_view(
+    get=extend_schema(
+        summary='View a Node\'s Ancestors',
+        description='Get the entities along a path from the root down, with their properties, in one query. When no '
+                    'entity exists at the path, the deepest existing ancestor is returned as the nearest entity, so '
+                    'a client can fall back to it without retrying each parent path.',
+        parameters=[
+            OpenApiParameter(
+                'path',
+                OpenApiTypes.STR,
+                OpenApiParameter.PATH,
+                description='Path to a node from the root node. The node itself need not exist.'
+            ),
+            OpenApiParameter(
+                'precise',
+                OpenApiTypes.BOOL,
+                OpenApiParameter.QUERY,
+                description='Display precise decimal values as strings.'
+            )
+        ],
+        responses={
+            200: GenericEAAncestorsSerializer,
+            404: OpenApiResponse(description='Not even the root of the path exists.')
+        },
+    ),
+)
+class AncestorsView(APIView):
+    renderer_classes = [SubtreeJSONRenderer]
+
+    def get(self, request, path):
+        full_path = '/' + path.strip('/')
+        ancestors = Entity.objects.fetch_ancestors(full_path)
+        if not ancestors:
+            raise NotFound('Entity not found.')
+
+        nearest = ancestors[-1]
+        return Response({
+            'path': full_path,
+            'found': nearest['path'] == full_path,
+            'nearest': nearest,
+            'ancestors': ancestors
+        }, status=status.HTTP_200_OK)
 
 
 class SimpleUseViewSet(viewsets.ModelViewSet):
-    renderer_classes = [CustomJSONRenderer]
+    renderer_classes = [SubtreeJSONRenderer]
     queryset = Entity.objects.all()
     serializer_class = GenericEASerializer
 
@@ -141,19 +388,69 @@ class SimpleUseViewSet(viewsets.ModelViewSet):
                 OpenApiTypes.BOOL,
                 OpenApiParameter.QUERY,
                 description='Display precise decimal values as strings.'
+            ),
+            OpenApiParameter(
+                'stream',
+                OpenApiTypes.BOOL,
+                OpenApiParameter.QUERY,
+                description='Stream the subtree as it is read from the database. Use for very large subtrees.'
+            ),
+            OpenApiParameter(
+                'depth',
+                OpenApiTypes.INT,
+                OpenApiParameter.QUERY,
+                description='Number of levels below the node to include. Nodes with omitted children are marked '
+                            'with "has_more": true.'
+            ),
+            OpenApiParameter(
+                'max_nodes',
+                OpenApiTypes.INT,
+                OpenApiParameter.QUERY,
+                description='Maximum number of nodes to include, filled level by level. Nodes with omitted '
+                            'children are marked with "has_more": true.'
             )
         ],
-        responses={200: GenericEASubtreeSerializer},
+        responses={
+            200: GenericEASubtreeSerializer,
+            304: OpenApiResponse(description='The subtree is unchanged since the ETag sent in If-None-Match.')
+        },
     )
     def get(self, request, *args, **kwargs):
         # Get path and eliminate trailing slash if present
         full_path = '/' + kwargs.get('path').strip('/')
+        options = SubtreeQuerySerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+        precise = request.query_params.get('precise', None) == 'true'
+        stream = request.query_params.get('stream', None) == 'true'
+
+        # Skip building the subtree when the client's copy is current
+        signature = Entity.objects.subtree_signature(full_path)
+        etag = None
+        if signature[0]:
+            etag = subtree_etag(
+                full_path, signature, options.validated_data, request.accepted_renderer.format, precise, stream
+            )
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
         try:
             entity = Entity.objects.get(path=full_path)
-            return Response(entity.subtree(), status=status.HTTP_200_OK)
         except Entity.DoesNotExist:
             return Response({'message': 'Entity not found.'})
 
+        if stream:
+            rows = Entity.objects.fetch_descendants(entity.path, **options.validated_data)
+            content = stream_subtree(rows, entity.path, precise)
+            if isinstance(request._request, ASGIRequest):
+                # Advance the cursor without blocking the event loop when served by Uvicorn
+                content = iterate_in_thread(content)
+            response = StreamingHttpResponse(content, content_type='application/json', status=status.HTTP_200_OK)
+        else:
+            response = Response(entity.subtree(**options.validated_data), status=status.HTTP_200_OK)
+        if etag:
+            response['ETag'] = etag
+        return response
+
     @extend_schema(
         summary='Create a Node or Attribute',
         description='Create a node by leaving the payload blank, or an attribute by including key/value pairs where \
@@ -190,10 +487,43 @@ class SimpleUseViewSet(viewsets.ModelViewSet):
                 OpenApiTypes.BOOL,
                 OpenApiParameter.QUERY,
                 description='Display precise decimal values as strings.'
+            ),
+            OpenApiParameter(
+                'return',
+                OpenApiTypes.STR,
+                OpenApiParameter.QUERY,
+                enum=['minimal'],
+                description='Respond with only the written node and its properties instead of its subtree. '
+                            'Equivalent to sending a "Prefer: return=minimal" header.'
+            ),
+            OpenApiParameter(
+                'Preference-Applied',
+                OpenApiTypes.STR,
+                OpenApiParameter.HEADER,
+                response=[201],
+                enum=['return=minimal'],
+                description='Present when only the written node was returned.'
+            ),
+            OpenApiParameter(
+                'Vary',
+                OpenApiTypes.STR,
+                OpenApiParameter.HEADER,
+                response=[201],
+                description='Includes "Prefer", since the "Prefer" header selects the response shape.'
             )
         ],
         request=GenericEAInputSerializer,
-        responses={201: GenericEASubtreeSerializer},
+        responses={
+            201: OpenApiResponse(
+                response=PolymorphicProxySerializer(
+                    component_name='GenericEACreated',
+                    serializers=[GenericEASubtreeSerializer, GenericEANodeSerializer],
+                    resource_type_field_name=None
+                ),
+                description='The written node\'s subtree, or only the node without "descendants" when '
+                            '"return=minimal" is requested.'
+            )
+        },
     )
     def create(self, request, *args, **kwargs):
         # Set up context fields from path kwarg
@@ -213,12 +543,14 @@ class SimpleUseViewSet(viewsets.ModelViewSet):
         # Pass request data to serializer
         # attributes = self._parse_attribute_body(request.body)
         serializer_data = request.data
+        minimal = prefers_minimal(request)
         serializer = GenericEASerializer(
             data=serializer_data,
             context={
                 'path': full_path,
                 'entity_name': entity_name,
                 'parent_entity': parent_entity,
+                'minimal': minimal,
                 # 'attributes': attributes
             }
         )
@@ -229,7 +561,11 @@ class SimpleUseViewSet(viewsets.ModelViewSet):
             except ValidationError as e:
                 return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
 
-            return Response(body, status=status.HTTP_201_CREATED)
+            response = Response(body, status=status.HTTP_201_CREATED)
+            patch_vary_headers(response, ['Prefer'])
+            if minimal:
+                response['Preference-Applied'] = 'return=minimal'
+            return response
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def _parse_attribute_body(self, body):
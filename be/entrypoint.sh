@@ -10,7 +10,7 @@ export DATABASE_URL=$DATABASE_URL
 function postgres_ready(){
 python << END
 import sys
-import psycopg2
+import psycopg
 from urllib.parse import urlparse
 
 result = urlparse("$DATABASE_URL")
@@ -22,8 +22,8 @@ hostname = result.hostname
 port     = result.port
 
 try:
-    conn = psycopg2.connect(
-        database=database,
+    conn = psycopg.connect(
+        dbname=database,
         user=username,
         password=password,
         host=hostname,
@@ -38,7 +38,7 @@ try:
         print("Database is up, but init sql is not complete.")
         raise RuntimeError()
     print("Advisory locks unlocked")
-except (psycopg2.OperationalError, RuntimeError):
+except (psycopg.OperationalError, RuntimeError):
     sys.exit(-1)
 sys.exit(0)
 END
@@ -0,0 +1,25 @@
+"""
+Gunicorn configuration for serving the API in production.
+
+Start with `gunicorn -c gunicorn.conf.py rocketjunior.wsgi`. Each worker process serves requests on a pool of
+threads, and each thread keeps its own persistent database connection, so Postgres must accept at least
+GUNICORN_WORKERS * GUNICORN_THREADS connections per instance.
+"""
+import os
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Restart workers periodically to bound memory growth, staggered so they do not all restart at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+# Set GUNICORN_ACCESS_LOG to an empty string to turn access logging off
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+# Serve with production settings unless told otherwise
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rocketjunior.settings_production')
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Closed-loop HTTP load test for the API.
+
+Each worker thread sends requests back to back over its own keep-alive connection for the given duration,
+then the script prints throughput and latency percentiles. Only the standard library is used, so it runs
+anywhere the API is reachable from.
+
+A `{n}` in the URL is replaced with a token unique to each request, so writes can create new nodes.
+
+Examples:
+    python loadtest.py http://localhost:8000/Rocket/Stage1 --concurrency 8 --duration 20
+    python loadtest.py "http://localhost:8000/Rocket?return=minimal" --method POST --data '{"Speed": 1.5}'
+    python loadtest.py "http://localhost:8000/Rocket/Node{n}?return=minimal" --method POST --data '{}'
+"""
+import argparse
+import http.client
+import itertools
+import threading
+import time
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+
+# Request numbers shared by all workers, prefixed with a run id so that repeated runs do not collide
+RUN_ID = uuid4().hex[:8]
+REQUEST_NUMBERS = itertools.count(1)
+
+
+def percentile(sorted_values, fraction):
+    """Returns the value at `fraction` of `sorted_values` using the nearest-rank method."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Worker(threading.Thread):
+    def __init__(self, url, method, body, headers, deadline):
+        super().__init__(daemon=True)
+        self.url = urlsplit(url)
+        self.target = self.url.path + (f'?{self.url.query}' if self.url.query else '')
+        self.method = method
+        self.body = body
+        self.headers = headers
+        self.deadline = deadline
+        self.latencies = []
+        self.errors = 0
+        self.connection = None
+
+    def connect(self):
+        connection_class = http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(self.url.hostname, self.url.port, timeout=30)
+
+    def run(self):
+        self.connect()
+        while time.perf_counter() < self.deadline:
+            start_time = time.perf_counter()
+            try:
+                target = self.target.replace('{n}', f'{RUN_ID}-{next(REQUEST_NUMBERS)}')
+                self.connection.request(self.method, target, body=self.body, headers=self.headers)
+                response = self.connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    self.errors += 1
+                else:
+                    self.latencies.append(time.perf_counter() - start_time)
+                if response.will_close:
+                    self.connection.close()
+                    self.connect()
+            except (OSError, http.client.HTTPException):
+                # Reconnect after dropped connections
+                self.errors += 1
+                self.connection.close()
+                self.connect()
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url', help='URL to request.')
+    parser.add_argument('--method', default='GET', help='HTTP method. Defaults to GET.')
+    parser.add_argument('--data', help='Request body, sent as JSON.')
+    parser.add_argument('--header', action='append', default=[], help='Extra "Name: value" header. Repeatable.')
+    parser.add_argument('--concurrency', type=int, default=4, help='Number of concurrent connections.')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run for.')
+    parser.add_argument('--warmup', type=float, default=1, help='Seconds to run before measuring.')
+    args = parser.parse_args()
+
+    headers = {'Content-Type': 'application/json'} if args.data else {}
+    for header in args.header:
+        name, value = header.split(':', 1)
+        headers[name.strip()] = value.strip()
+    body = args.data.encode('utf-8') if args.data else None
+
+    def run(duration):
+        deadline = time.perf_counter() + duration
+        workers = [Worker(args.url, args.method, body, headers, deadline) for _ in range(args.concurrency)]
+        start_time = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return workers, time.perf_counter() - start_time
+
+    if args.warmup:
+        run(args.warmup)
+    workers, elapsed = run(args.duration)
+
+    latencies = sorted(latency for worker in workers for latency in worker.latencies)
+    errors = sum(worker.errors for worker in workers)
+    print(f'requests={len(latencies)}  errors={errors}  seconds={elapsed:.2f}  '
+          f'requests_per_second={len(latencies) / elapsed:.1f}')
+    if latencies:
+        print('  '.join(
+            f'{name}_ms={percentile(latencies, fraction) * 1000:.2f}'
+            for name, fraction in [('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0)]
+        ))
+
+
+if __name__ == '__main__':
+    main()
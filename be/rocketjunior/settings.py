@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import sys
 import dj_database_url
 from pathlib import Path
 
@@ -78,13 +79,47 @@ WSGI_APPLICATION = 'rocketjunior.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Connections are kept open for DB_CONN_MAX_AGE seconds and checked before they are reused
 DATABASES = {
     'default': dj_database_url.config(
         default=os.getenv('DATABASE_URL'),
-        conn_max_age=0
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        conn_health_checks=os.getenv('DB_CONN_HEALTH_CHECKS', 'true') == 'true'
     )
 }
 
+# Optional psycopg connection pool shared by all threads of a process; replaces persistent connections
+if os.getenv('DB_POOL') == 'true':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# Tests use the in-process cache so that they never share cached subtrees with a running server's Redis
+TESTING = sys.argv[1:2] == ['test']
+
+if os.getenv('REDIS_URL') and not TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    # In-process LRU fallback. Invalidations do not reach other processes, so only use it with a single worker.
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('LOCAL_CACHE_MAX_ENTRIES', 1000))},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -183,3 +218,13 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # App settings
 APPEND_SLASH = True
 HIDE_API_EXTENSIONS = os.getenv('HIDE_API_EXTENSIONS') == 'true'
+# Rows read per round trip from the server-side cursor behind subtree queries
+ENTITY_FETCH_BATCH_SIZE = int(os.getenv('ENTITY_FETCH_BATCH_SIZE', 2000))
+# Rows written per INSERT statement by bulk imports
+ENTITY_IMPORT_BATCH_SIZE = int(os.getenv('ENTITY_IMPORT_BATCH_SIZE', 1000))
+# Structure used to select subtrees: path, ltree or closure. Run the rebuild_hierarchy command after changing it
+ENTITY_HIERARCHY_BACKEND = os.getenv('ENTITY_HIERARCHY_BACKEND', 'path')
+# Encoder for compact subtree responses: json, or orjson for faster encoding once orjson is installed
+ENTITY_JSON_ENCODER = os.getenv('ENTITY_JSON_ENCODER', 'json')
+# Seconds a built subtree stays cached; writes invalidate affected subtrees sooner
+SUBTREE_CACHE_TIMEOUT = int(os.getenv('SUBTREE_CACHE_TIMEOUT', 300))
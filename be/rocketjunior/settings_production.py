@@ -0,0 +1,16 @@
+"""
+Django settings for serving rocketjunior in production.
+
+Extends the development settings with debug mode off, which also stops Django from keeping every executed
+SQL query in memory. Use with `DJANGO_SETTINGS_MODULE=rocketjunior.settings_production`.
+"""
+
+from rocketjunior.settings import *  # noqa: F401,F403
+from rocketjunior.settings import os, SECRET_KEY
+
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+SECRET_KEY = os.getenv('SECRET_KEY', SECRET_KEY)
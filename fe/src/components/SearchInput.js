@@ -1,15 +1,31 @@
 import React, { useState, useEffect } from 'react';
 import _ from 'lodash';
-import { fetchTreeData } from '../services/apiService';
+import { fetchNearestTree, fetchTreeData, searchPaths } from '../services/apiService';
 const SearchInput = ({ onResults }) => {
   const [query, setQuery] = useState('');
+  const [suggestions, setSuggestions] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
   const [requestStatus, setRequestStatus] = useState('danger');
 
   // Debounced function that calls the API service
   const debouncedSearch = _.debounce(async (searchTerm) => {
     try {
-      const data = await fetchTreeData(searchTerm || "");
+      let data;
+      if (searchTerm) {
+        // Suggest paths completing the query
+        const path = `/${searchTerm.replace(/^\/+|\/+$/g, '')}`;
+        const matches = await searchPaths(path);
+        if (matches !== null) {
+          setSuggestions(matches);
+        }
+        // Build the whole subtree only once the query names a node, e.g. a picked suggestion. Partial queries
+        // show the children of their nearest existing ancestor instead.
+        const isNode = matches !== null && matches.some((match) => match.path === path);
+        data = isNode ? await fetchTreeData(path) : await fetchNearestTree(path);
+      } else {
+        setSuggestions([]);
+        data = await fetchTreeData("");
+      }
       if (data !== null) {
         setRequestStatus('secondary');
       } else {
@@ -35,9 +51,17 @@ const SearchInput = ({ onResults }) => {
         placeholder="Enter node path (i.e. Rocket, Rocket/Stage1)"
         value={query}
         onChange={(e) => setQuery(e.target.value)}
+        list="search-suggestions"
         style={{ paddingRight: '40px' }}
         className={`form-control mb-3 border border-${requestStatus}`}
       />
+      <datalist id="search-suggestions">
+        {suggestions.map((suggestion) => (
+          <option key={suggestion.id} value={suggestion.path.slice(1)}>
+            {`${suggestion.child_count} children`}
+          </option>
+        ))}
+      </datalist>
       {isLoading && (
         <div 
           style={{
@@ -3,23 +3,21 @@
 const BASE_URL = process.env.REACT_APP_API_URL || "http://json-server:3001";
 
 /**
- * Fetch tree data from the modked API.
+ * Fetch tree data from the API, falling back to the deepest existing ancestor when the path does not exist.
  */
 export const fetchTreeData = async (path = "") => {
   try {
     const trimmedPath = path.startsWith('/') ? path.slice(1) : path;
     let encodedPath = encodeURIComponent(trimmedPath);
     let response = await fetch(`${BASE_URL}/${encodedPath}`);
-    let data;
-    if (!response.ok) {
-      // Try with parent path if current path does not work
-      const parentPath = trimmedPath.substring(0, trimmedPath.lastIndexOf('/'));
-      if (parentPath) {
-        data = await fetchTreeData(parentPath);
-      } else {
+    let data = response.ok ? await response.json() : null;
+    if (!data || data.id === undefined) {
+      // Find the nearest existing ancestor in one request rather than retrying each parent path
+      const nearestPath = await fetchNearestPath(trimmedPath);
+      if (!nearestPath || nearestPath === `/${trimmedPath}`) {
         throw new Error(`No data for query ${path}: ${response.statusText}`);
       }
-    } else {
+      response = await fetch(`${BASE_URL}/${encodeURIComponent(nearestPath.slice(1))}`);
       data = await response.json();
     }
     return data;
@@ -27,3 +25,45 @@ export const fetchTreeData = async (path = "") => {
     return null;
   }
 };
+
+/**
+ * Fetch the deepest existing node along a path with its children only, or null if not even its root exists.
+ */
+export const fetchNearestTree = async (path) => {
+  try {
+    const trimmedPath = path.startsWith('/') ? path.slice(1) : path;
+    const nearestPath = await fetchNearestPath(trimmedPath);
+    if (!nearestPath) {
+      throw new Error(`No data for query ${path}`);
+    }
+    const response = await fetch(`${BASE_URL}/${encodeURIComponent(nearestPath.slice(1))}?depth=1`);
+    return response.ok ? await response.json() : null;
+  } catch (error) {
+    return null;
+  }
+};
+
+/**
+ * Fetch the path of the deepest existing entity along a path, or null if not even its root exists.
+ */
+export const fetchNearestPath = async (path) => {
+  const response = await fetch(`${BASE_URL}/api/v1/ancestors/${encodeURIComponent(path)}`);
+  if (!response.ok) {
+    return null;
+  }
+  const data = await response.json();
+  return data.nearest ? data.nearest.path : null;
+};
+
+/**
+ * Search for nodes matching a partial path or the start of a name. Returns null if the search fails.
+ */
+export const searchPaths = async (query, limit = 10) => {
+  try {
+    const params = new URLSearchParams({ q: query, limit });
+    const response = await fetch(`${BASE_URL}/api/v1/search/?${params}`);
+    return response.ok ? await response.json() : null;
+  } catch (error) {
+    return null;
+  }
+};